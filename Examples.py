@@ -14,6 +14,7 @@ from pathlib import Path
 import click
 
 import config
+import java_syntax
 from directories import exists, erase
 
 logging.basicConfig(
@@ -30,6 +31,7 @@ tools_to_copy = [
         "_verify_output.bat",
         "_update_extracted_example_output.bat",
         "_capture_gradle.bat",
+        "_run_examples.bat",  # Parallel alternative to 'gradlew run'
         "chkstyle.bat",  # Run checkstyle, capturing output
         # "gg.bat", # Short for gradlew
     ]
@@ -160,6 +162,9 @@ def all():
     extract_all_examples()
     init_example_dir_gradle_files()
     init_java11_dir_gradle_files()
+    # Catch unbalanced braces etc. before a Gradle build does:
+    for example_dir in [config.example_dir, config.java11_dir]:
+        java_syntax.report(example_dir)
 
 
 if __name__ == "__main__":
@@ -7,9 +7,10 @@ TODO = """
 from pathlib import Path
 import sys
 import shutil
+import time
 from betools import CmdLine
 import config
-from reformat_markdown import ReformatMarkdownDocument
+from reformat_markdown import ReformatMarkdownDocument, RuleStats, ParagraphCache
 from CheckReformatted import compare
 
 WIDTH = 80
@@ -37,10 +38,13 @@ def create_reformatted_directory():
 @CmdLine("f", num_args=1)
 def formatOneFile():
     "Format a single file"
-    _formatOneFile(sys.argv[2])
+    cache = ParagraphCache()
+    _formatOneFile(sys.argv[2], cache)
+    cache.save()
 
 
-def _formatOneFile(arg):
+def _formatOneFile(arg, cache=None):
+    "True if the file changed"
     # create_reformatted_directory()
     fname = Path(arg).name
     source_file = config.markdown_dir / fname
@@ -54,24 +58,47 @@ def _formatOneFile(arg):
     markdown = source_file.read_text(encoding="utf-8")
     # target = config.reformat_dir / fname # (Path(arg).stem + "-reformatted.md")
     target = config.markdown_dir / fname
-    reformatted = ReformatMarkdownDocument(fname, markdown, WIDTH).reformat()
+    document = ReformatMarkdownDocument(fname, markdown, WIDTH, cache=cache)
+    reformatted = document.reformat()
+    if document.all_cached() and reformatted + "\n" == markdown:
+        return False  # Already canonical: nothing to write or check
     target.write_text(reformatted + "\n", encoding="utf8")
     print("Checking result")
     compare(markdown, reformatted)
+    return True
 
 
 @CmdLine("a")
 def reformat_all():
     print("Reformatting all markdown files ...")
-    for sourceText in config.markdown_dir.glob("*.md"):
-        _formatOneFile(sourceText)
-
-
+    cache = ParagraphCache()
+    changed = [sourceText.name for sourceText in config.markdown_dir.glob("*.md")
+               if _formatOneFile(sourceText, cache)]
+    cache.save(prune=True)
+    print("{} files rewritten: {}".format(len(changed), ", ".join(changed)))
 
     # slugline = re.compile("^(//|#) .+?\.[a-z]+$", re.MULTILINE)
     # xmlslug  = re.compile("^<!-- .+?\.[a-z]+ +-->$", re.MULTILINE)
     # for group in re.findall("```(.*?)\n(.*?)\n```", text, re.DOTALL):
 
 
+@CmdLine("p")
+def profile_rules():
+    "Time each parser rule while reformatting all markdown files (writes nothing)"
+    documents = [(md.name, md.read_text(encoding="utf-8"))
+                 for md in sorted(config.markdown_dir.glob("*.md"))]
+    start = time.perf_counter()
+    for name, markdown in documents:
+        ReformatMarkdownDocument(name, markdown, WIDTH, trace=False).reformat()
+    plain = time.perf_counter() - start
+    stats = RuleStats()
+    start = time.perf_counter()
+    for name, markdown in documents:
+        ReformatMarkdownDocument(name, markdown, WIDTH, stats, trace=False).reformat()
+    print(stats.report())
+    print("{} files: {:.2f}s, {:.2f}s with timing".format(
+        len(documents), plain, time.perf_counter() - start))
+
+
 if __name__ == '__main__':
     CmdLine.run()
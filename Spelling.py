@@ -13,25 +13,16 @@ import shutil
 from betools import CmdLine
 from sortedcontainers import SortedSet
 from ebook_build import *
+import code_fences
 import config
 
 # print(combined.encode("windows-1252"))
 
 def filter_out_code(text):
     "Remove all code listings from text"
-    result = []
-    index = 0
-    code = False
-    for line in text.splitlines():
-        if line.startswith("```"):
-            code = not code
-            continue
-        if code:
-            continue
-        result.append(line)
-    decoded = "\n".join(result)
+    decoded = code_fences.strip(text).text
     config.stripped_for_style.write_text(decoded + "\n", encoding="utf8")
-    stripped = re.sub(r'`.*?`', ' ', decoded, flags=re.DOTALL)
+    stripped = code_fences.blank_inline_code(decoded)
     config.stripped_for_spelling.write_text(stripped + "\n", encoding="utf8")
 
 
@@ -1 +1 @@
-gradlew run 1> run_trace.txt 2>&1
+gradlew run 2>&1 | py -3 %ONJAVA_TOOLS%\gradle_trace.py live run_trace.txt
@@ -0,0 +1,2 @@
+@echo off
+py -3 %ONJAVA_TOOLS%\run_examples.py %*
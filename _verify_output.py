@@ -2,10 +2,12 @@
 # Requires Python 3.5
 # Validates output from executable Java programs in "On Java 8."
 # Use chain of responsibility to successively try strategies until one matches
+import json
 import os
 import re
 import sys
 import textwrap
+import time
 from collections import defaultdict
 from difflib import SequenceMatcher
 from pathlib import Path
@@ -13,6 +15,9 @@ from pathlib import Path
 from betools import CmdLine
 
 import config
+import numeric_table as tables
+import shards
+from directives import runnable_examples
 
 
 ########### Chain of Responsibility Match Finder #######################
@@ -70,6 +75,11 @@ def words_only(input_text):
                 if word_only.fullmatch(w)]))
 
 
+def numeric_table(input_text):
+    "Placeholder; compares with numeric_table.tables_match()"
+    return input_text
+
+
 def ratio(input_text):
     return True
 
@@ -85,6 +95,7 @@ strategies = [
     (ignore_dates,              True),
     (ignore_memory_addresses,   True),
     (sort_lines,                False),
+    (numeric_table,             False),
     (ignore_digits,             False),
     (sort_words,                False),
     (unique_lines,              False),
@@ -94,12 +105,89 @@ strategies = [
     # (no_match,                  False),
 ]
 
+# A table that numeric_table checked and found changed mustn't then match
+# a later strategy that just throws its numbers away:
+after_numeric_table = [strategy for strategy, retain in strategies].index(numeric_table) + 1
+
+
+class StrategyStats:
+    """
+    Per-strategy calls, hits and CPU time, plus the strategy that matched
+    each example last time. Persisted in config.history_dir across runs.
+    """
+    stats_file = config.history_dir / "strategy_stats.json"
+
+    def __init__(self):
+        self.strategies = {}
+        self.winners = {}
+        if StrategyStats.stats_file.exists():
+            saved = json.loads(StrategyStats.stats_file.read_text())
+            self.strategies = saved["strategies"]
+            self.winners = saved["winners"]
+        for strategy, retain in strategies:
+            self.strategies.setdefault(
+                strategy.__name__, dict(calls=0, hits=0, cpu=0.0))
+
+    def apply(self, strategy, embedded_output, generated_output, javafile):
+        """
+        Filter both outputs, charging the CPU time to the strategy.
+        Returns (matched, filtered outputs), or None if the strategy
+        doesn't apply to javafile.
+        """
+        if strategy is numeric_table:
+            settings = tables.settings_for(javafile.name)
+            if settings is None or not tables.available():
+                return None
+        start = time.process_time()
+        if strategy is numeric_table:
+            filtered = (embedded_output, generated_output)
+            matched = tables.tables_match(embedded_output, generated_output, settings)
+        else:
+            filtered = (strategy(embedded_output), strategy(generated_output))
+            matched = filtered[0] == filtered[1]
+        counts = self.strategies[strategy.__name__]
+        counts["calls"] += 1
+        counts["cpu"] += time.process_time() - start
+        return matched, filtered
+
+    def hit(self, strategy_name, java_name):
+        self.strategies[strategy_name]["hits"] += 1
+        self.winners[java_name] = strategy_name
+
+    def save(self):
+        config.history_dir.mkdir(parents=True, exist_ok=True)
+        StrategyStats.stats_file.write_text(json.dumps(
+            dict(strategies=self.strategies, winners=self.winners), indent=1))
+
+    def __str__(self):
+        result = "{:<25}{:>8}{:>8}{:>8}{:>12}\n".format(
+            "strategy", "calls", "hits", "hit %", "cpu ms/call")
+        for strategy, retain in strategies:
+            counts = self.strategies[strategy.__name__]
+            calls = max(counts["calls"], 1)
+            result += "{:<25}{:>8}{:>8}{:>8.1f}{:>12.3f}\n".format(
+                strategy.__name__, counts["calls"], counts["hits"],
+                100.0 * counts["hits"] / calls, 1000 * counts["cpu"] / calls)
+        return result
+
+
+def input_to(index, embedded_output, generated_output):
+    "Outputs as seen by strategies[index]: after all preceding retained filters"
+    for strategy, retain in strategies[:index]:
+        if retain:
+            embedded_output = strategy(embedded_output)
+            generated_output = strategy(generated_output)
+    return embedded_output, generated_output
+
 
 class Validator(defaultdict):  # Map of lists
     compare_output = config.example_dir / "compare_output.bat"
 
-    def __init__(self):
+    def __init__(self, adaptive=False):
         super().__init__(list)
+        # adaptive: try each example's previous winning strategy first
+        self.adaptive = adaptive
+        self.stats = StrategyStats()
         # Erase the old results files:
         if Validator.compare_output.exists():
             Validator.compare_output.unlink()
@@ -108,68 +196,138 @@ class Validator(defaultdict):  # Map of lists
             if strat_batch.exists():
                 strat_batch.unlink()
 
+    def record_output(self, javafile, strategy_name, generated_output, result=None):
+        tfile = javafile.with_suffix("." + strategy_name)
+        edit_command = "subl " + str(tfile) + "\n"
+        with (config.example_dir / (strategy_name + ".bat")).open('a') as strat_batch:
+            strat_batch.write(edit_command)
+        with Validator.compare_output.open('a') as batch:
+            batch.write(edit_command)
+        with tfile.open('w') as trace_file:
+            trace_file.write(javafile.read_text() + "\n\n")
+            trace_file.write("// === Actual ===\n\n")
+            trace_file.write(str(generated_output))
+            if result:
+                trace_file.write("\n" + "*" * 55 + "\n")
+                trace_file.write(result + "\n")
+
+    def matched(self, javafile, java_name, strategy_name, generated_output, adaptive=False):
+        # An adaptive hit skipped the strategies before it, which might match now:
+        self[adaptive_label(strategy_name) if adaptive else strategy_name].append(java_name)
+        self.stats.hit(strategy_name, java_name)
+        if strategy_name != "exact_match":
+            self.record_output(javafile, strategy_name, generated_output)
+
+    def previous_winner(self, javafile, java_name, embedded_output, generated_output):
+        """
+        Adaptive mode: try the strategy that matched last time, after
+        exact_match (a single comparison, and catches improved output).
+        Its canonical predecessors aren't tried, so a match here is
+        reported under adaptive_label(), not as the canonical class.
+        Returns (index, (matched, filtered outputs)) or None if not applicable.
+        """
+        names = [strategy.__name__ for strategy, retain in strategies]
+        winner = self.stats.winners.get(java_name)
+        if winner not in names or winner in ("exact_match", "ratio"):
+            return None
+        if embedded_output == generated_output:
+            return None  # Let the canonical chain report exact_match
+        index = names.index(winner)
+        if index >= after_numeric_table and checked_as_table(javafile):
+            return None
+        result = self.stats.apply(
+            strategies[index][0], *input_to(index, embedded_output, generated_output),
+            javafile)
+        return (index, result) if result else None
+
     def find_output_match(self, javafile, embedded_output, generated_output):
-        for strategy, retain in strategies:
+        java_name = str(javafile.relative_to(config.example_dir))
+        tried = None
+        if self.adaptive:
+            tried = self.previous_winner(
+                javafile, java_name, embedded_output, generated_output)
+            if tried and tried[1][0]:
+                strategy_name = strategies[tried[0]][0].__name__
+                return self.matched(javafile, java_name, strategy_name, generated_output,
+                                    adaptive=True)
+        for index, (strategy, retain) in enumerate(strategies):
             strategy_name = strategy.__name__
-            if strategy_name == "ratio":
-                print(strategy_name)
-
-            def record_output(result=None):
-                tfile = javafile.with_suffix("." + strategy_name)
-                edit_command = "subl " + str(tfile) + "\n"
-                with (config.example_dir / (strategy_name + ".bat")).open('a') as strat_batch:
-                    strat_batch.write(edit_command)
-                with Validator.compare_output.open('a') as batch:
-                    batch.write(edit_command)
-                with tfile.open('w') as trace_file:
-                    trace_file.write(javafile.read_text() + "\n\n")
-                    trace_file.write("// === Actual ===\n\n")
-                    trace_file.write(str(generated_output))
-                    if result:
-                        trace_file.write("\n" + "*" * 55 + "\n")
-                        trace_file.write(result + "\n")
-
+            if index == after_numeric_table and checked_as_table(javafile):
+                strategy_name = "ratio"  # numeric_table missed: report a mismatch
             if strategy_name == "ratio":
                 print("++++ " + strategy_name)
                 ratio = SequenceMatcher(
                     None, embedded_output, generated_output).ratio()
-                record_output("Ratio = %.2f" % ratio)
+                self.record_output(javafile, strategy_name, generated_output,
+                                   "Ratio = %.2f" % ratio)
+                self.stats.winners.pop(java_name, None)
                 return
 
-            filtered_embedded_output = strategy(embedded_output)
-            filtered_generated_output = strategy(generated_output)
-            if filtered_embedded_output == filtered_generated_output:
-                self[strategy_name].append(str(javafile.relative_to(config.example_dir)))
-                if strategy_name == "exact_match":
-                    return
-                record_output()
-                return
+            if tried and index == tried[0]:
+                result = tried[1]
+            else:
+                result = self.stats.apply(
+                    strategy, embedded_output, generated_output, javafile)
+            if result is None:
+                continue
+            matched, (filtered_embedded_output, filtered_generated_output) = result
+            if matched:
+                return self.matched(javafile, java_name, strategy_name, generated_output)
             if retain:
                 embedded_output = filtered_embedded_output
                 generated_output = filtered_generated_output
 
-    def log_results(self):
-        log = open("verified_output.txt", 'w')
-        for strategy, retain in strategies:
-            key = strategy.__name__
-            # if key is "exact_match":
-            #     for java in self[key]:
-            #         print(java)
-            # elif key in self:
-            if key in self:
+    def log_results(self, shard=None):
+        self.stats.save()
+        by_strategy = {label: self[label]
+                       for strategy, retain in strategies
+                       for label in (strategy.__name__, adaptive_label(strategy.__name__))
+                       if label in self}
+        write_verified_output(by_strategy)
+        if shard:
+            shards.write_verification(shard, by_strategy)
+
+
+def checked_as_table(javafile):
+    "numeric_table decides whether javafile's output matches"
+    return tables.settings_for(javafile.name) is not None and tables.available()
+
+
+def adaptive_label(strategy_name):
+    "Where matches by a previous winner, tried out of order, are reported"
+    return strategy_name + " (adaptive)"
+
+
+def write_verified_output(by_strategy):
+    "verified_output.txt from {strategy name: [java files]}, in strategy order"
+    log = open("verified_output.txt", 'w')
+    for strategy, retain in strategies:
+        # if key is "exact_match":
+        #     for java in self[key]:
+        #         print(java)
+        # elif key in self:
+        for key in (strategy.__name__, adaptive_label(strategy.__name__)):
+            if key in by_strategy:
                 log.write("\n" + (" " + key + " ").center(45, "=") + "\n")
-                for java in self[key]:
+                for java in by_strategy[key]:
                     log.write(java + "\n")
-        log.close()
+    log.close()
 
 
-def validate_all():
+def validate_all(adaptive=False, shard=None):
     # Generate '.p1' files:
     config.reformat_runoutput_files()
     find_output = re.compile(r"/\* (Output:.*)\*/", re.DOTALL)
-    validator = Validator()
+    validator = Validator(adaptive)
+    in_shard = None
+    if shard:
+        in_shard = shards.names(
+            shards.select(runnable_examples(config.example_dir), shard))
     for outfile in config.example_dir.rglob("*.p1"):
         javafile = outfile.with_suffix(".java")
+        if in_shard is not None and (
+                javafile.relative_to(config.example_dir).as_posix() not in in_shard):
+            continue
         if not javafile.exists():
             print(str(outfile) + " has no javafile")
             sys.exit(1)
@@ -186,7 +344,7 @@ def validate_all():
             javafile,
             find_output.search(javatext).group(0).strip(),
             outfile.read_text().strip())
-    validator.log_results()
+    validator.log_results(shard)
 
 
 @CmdLine("a")
@@ -198,6 +356,34 @@ def verify_all_output():
     os.system("cat verified_output.txt")
 
 
+@CmdLine("p")
+def verify_all_output_adaptively():
+    """
+    Like -a, but try each example's previously matching strategy first
+    (matches found that way are listed as '<strategy> (adaptive)')
+    """
+    validate_all(adaptive=True)
+    os.system("cat verified_output.txt")
+
+
+@CmdLine("h", num_args=1)
+def verify_shard():
+    """
+    Like -a, for only the examples in shard i/N (see shards.py); adds the
+    results to that shard's bundle
+    """
+    validate_all(shard=sys.argv[2])
+    os.system("cat verified_output.txt")
+
+
+@CmdLine("s")
+def show_strategy_stats():
+    """
+    Show calls, hits and CPU time recorded for each strategy
+    """
+    print(StrategyStats())
+
+
 @CmdLine("u")
 def display_unmatched_output():
     """
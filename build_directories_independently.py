@@ -1,7 +1,13 @@
 # Make sure all subdirectories can be compiled and runindependently 
 # (that the gradle dependencies are correct). 
+# The 'i' and 'x' commands do the same on a bounded pool, each directory
+# in its own copy of the tree, so no global clean is needed between them.
 import os
+import shutil
+import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from subprocess import call
 from pathlib import Path
 import config
@@ -26,6 +32,66 @@ def gradle(arg):
         sys.exit(1)
     print("{} {} Succeeded {}".format(leader, cmd, leader))
 
+
+isolated_dir = config.history_dir / "isolated_builds"
+isolated_jobs = max(1, (os.cpu_count() or 2) // 2)  # Each build is multithreaded
+
+
+def subdirectories(names=None):
+    dirs = [d for d in config.example_dir.glob("*") if d.is_dir() and d.name not in exclude]
+    if names:
+        dirs = [d for d in dirs if d.name in names]
+    return sorted(dirs)
+
+
+def isolated_copy(dir):
+    "Fresh copy of the example tree, without build outputs, for building dir"
+    copy = isolated_dir / dir.name
+    if copy.exists():
+        shutil.rmtree(copy)
+    shutil.copytree(config.example_dir, copy, symlinks=True,
+                    ignore=shutil.ignore_patterns("build", ".gradle", "*.out", "*.err"))
+    return copy
+
+
+def isolated_build(dir, task):
+    "Build dir:task in its own copy; (name, passed, seconds, log file)"
+    start = time.time()
+    log = isolated_dir / f"{dir.name}-{task}.log"
+    copy = isolated_copy(dir)
+    gradlew = str(copy / "gradlew.bat") if os.name == "nt" else "./gradlew"
+    with log.open("w") as output:
+        passed = subprocess.call([gradlew, "--console=plain", f"{dir.name}:{task}"],
+                                 cwd=copy, stdout=output, stderr=subprocess.STDOUT) == 0
+    if passed:  # Keep failed copies for inspection
+        shutil.rmtree(copy, ignore_errors=True)
+    return dir.name, passed, time.time() - start, log
+
+
+def build_isolated(task, names=None):
+    dirs = subdirectories(names)
+    isolated_dir.mkdir(parents=True, exist_ok=True)
+    print(f"{task} for {len(dirs)} directories, {isolated_jobs} at a time, in {isolated_dir}")
+    start = time.time()
+    results = []
+    with ThreadPoolExecutor(max_workers=isolated_jobs) as pool:
+        futures = [pool.submit(isolated_build, dir, task) for dir in dirs]
+        for future in as_completed(futures):
+            name, passed, seconds, log = future.result()
+            print(f"    {name}: {'passed' if passed else 'FAILED'} ({seconds:.1f}s)")
+            results.append((name, passed, seconds, log))
+    print(f"\n{'Directory':<30}{'Result':>8}{'Seconds':>10}")
+    for name, passed, seconds, log in sorted(results):
+        print(f"{name:<30}{'pass' if passed else 'FAIL':>8}{seconds:>10.1f}")
+    failed = [log for name, passed, seconds, log in results if not passed]
+    print(f"{len(results) - len(failed)} passed, {len(failed)} failed "
+          f"in {time.time() - start:.1f}s")
+    for log in sorted(failed):
+        print(f"    see {log}")
+    if failed:
+        sys.exit(1)
+
+
 @CmdLine('b')
 def compile_all_directories_independently():
     "Runs gradlew clean, then gradle subdirectory:compileJava for each subdirectory."
@@ -44,5 +110,17 @@ def run_all_directories_independently():
         gradle("{}:run".format(dir.name))
 
 
+@CmdLine('i', num_args="*")
+def compile_directories_in_isolation():
+    "Parallel subdirectory:compileJava, each in its own copy (optional: directory names)"
+    build_isolated("compileJava", sys.argv[2:])
+
+
+@CmdLine('x', num_args="*")
+def run_directories_in_isolation():
+    "Parallel subdirectory:run, each in its own copy (optional: directory names)"
+    build_isolated("run", sys.argv[2:])
+
+
 if __name__ == '__main__':
     CmdLine.run()
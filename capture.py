@@ -0,0 +1,115 @@
+"""
+Bounded-memory capture of example output.
+
+Output slugs '(First N Lines)' and '(First and Last N Lines)' only ever
+use N lines from each end (see config.adjust_lines), so only those are
+kept: the head in a list, the tail in a ring buffer. Everything else is
+kept up to max_output_bytes. Whatever is dropped is replaced by an
+explicit '___[ Output truncated ... ]___' line.
+"""
+import re
+from collections import deque
+
+max_output_bytes = 1 << 20
+
+first_lines = re.compile(r"\(First (\d+) Lines\)")
+first_and_last_lines = re.compile(r"\(First and Last (\d+) Lines\)")
+
+
+class BoundedCapture:
+
+    def __init__(self, head_lines=None, tail_lines=0, max_bytes=None):
+        # head_lines None: no line limits, just the byte cap
+        self.head_lines = head_lines
+        self.max_bytes = max_bytes or max_output_bytes
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self.tail_seen = 0
+        self.partial = b""
+        self.chunks = []
+        self.size = 0
+        self.dropped_bytes = 0
+
+    def feed(self, chunk):
+        if self.head_lines is None:
+            keep = max(self.max_bytes - self.size, 0)
+            self.chunks.append(chunk[:keep])
+            self.size += min(len(chunk), keep)
+            self.dropped_bytes += max(len(chunk) - keep, 0)
+            return
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = self.cut(lines.pop())
+        self.add_lines([self.cut(line) for line in lines])
+
+    def cut(self, line):
+        "A single runaway line keeps only its first max_bytes"
+        if len(line) > self.max_bytes:
+            self.dropped_bytes += len(line) - self.max_bytes
+            return line[:self.max_bytes]
+        return line
+
+    def add_lines(self, lines):
+        room = self.head_lines - len(self.head)
+        if room > 0:
+            self.head.extend(lines[:room])
+            lines = lines[room:]
+        self.tail_seen += len(lines)
+        self.tail.extend(lines)
+
+    def drain(self, stream):
+        "Feed everything from a binary stream, a chunk at a time"
+        for chunk in iter(lambda: stream.read1(1 << 16), b""):
+            self.feed(chunk)
+        if self.partial:
+            self.add_lines([self.partial])
+            self.partial = b""
+
+    def truncated(self):
+        return bool(self.dropped_bytes or self.tail_seen > len(self.tail))
+
+    def result(self):
+        if self.head_lines is None:
+            text = b"".join(self.chunks)
+            if self.dropped_bytes:
+                if not text.endswith(b"\n"):
+                    text += b"\n"
+                text += (f"___[ Output truncated after {self.max_bytes} bytes: "
+                         f"{self.dropped_bytes} bytes omitted ]___\n").encode()
+            return text
+        lines = list(self.head)
+        omitted = self.tail_seen - len(self.tail)
+        if omitted:
+            lines.append(f"___[ Output truncated: {omitted} lines omitted ]___".encode())
+        elif self.dropped_bytes:
+            lines.append(f"___[ Output truncated: {self.dropped_bytes} bytes "
+                         f"omitted from overlong lines ]___".encode())
+        lines.extend(self.tail)
+        return b"\n".join(lines) + b"\n" if lines else b""
+
+
+def for_output_line(output_line):
+    "A BoundedCapture sized for an example's '/* Output:' line (or None)"
+    if output_line:
+        both = first_and_last_lines.search(output_line)
+        if both:
+            return BoundedCapture(int(both.group(1)), int(both.group(1)))
+        first = first_lines.search(output_line)
+        if first:
+            return BoundedCapture(int(first.group(1)))
+    return BoundedCapture()
+
+
+def restored(head, tail, omitted_lines, dropped_bytes, output_line=None):
+    """
+    The result() of a capture made elsewhere with for_output_line()'s
+    limits (harness/BatchHarness.java), from what it kept and dropped
+    """
+    capture = for_output_line(output_line)
+    if capture.head_lines is None:
+        capture.chunks = [head]
+    else:
+        capture.head = head.split(b"\n")[:-1]
+        capture.tail.extend(tail.split(b"\n")[:-1])
+        capture.tail_seen = len(capture.tail) + omitted_lines
+    capture.dropped_bytes = dropped_bytes
+    return capture.result()
@@ -0,0 +1,69 @@
+"""
+Classpaths of the extracted examples, one per chapter, as each Gradle
+subproject has its own runtimeClasspath. Every chapter has its own
+default package, so two chapters can each have a default-package class
+of the same name: a chapter's own class (and resource) directories come
+first, then those of onjava (every subproject depends on it) and of any
+other chapter its listings use, then the entries (jars, etc.) listed one
+per line in base/classpath.txt.
+"""
+import os
+
+from dependency_graph import DependencyGraph
+
+
+def class_dir(base, chapter):
+    return base / chapter / "build" / "classes" / "java" / "main"
+
+
+def resource_dir(base, chapter):
+    return base / chapter / "build" / "resources" / "main"
+
+
+def extra_entries(base):
+    extra = base / "classpath.txt"
+    if not extra.exists():
+        return []
+    return [line.strip() for line in extra.read_text().splitlines() if line.strip()]
+
+
+class Classpaths:
+    """
+    Classpaths for base's chapters. override: one classpath for every
+    example instead (run_examples.py --classpath)
+    """
+
+    def __init__(self, base, graph=None, override=None):
+        self.base = base
+        self.override = override
+        self.uses = {} if override else (graph or DependencyGraph(base)).chapter_dependencies()
+        self.extra = extra_entries(base)
+        self.runtimes = {}
+
+    def chapters(self, chapters):
+        "chapters, then onjava and the other chapters they use"
+        used = set().union(*(self.uses.get(chapter, set()) for chapter in chapters))
+        if (self.base / "onjava").is_dir():
+            used.add("onjava")
+        return list(chapters) + sorted(used - set(chapters),
+                                       key=lambda chapter: (chapter != "onjava", chapter))
+
+    def compile(self, chapters):
+        "javac -cp for compiling the sources of chapters"
+        entries = [str(class_dir(self.base, chapter)) for chapter in self.chapters(chapters)]
+        return os.pathsep.join(entries + self.extra)
+
+    def runtime(self, chapter):
+        "java -cp for running chapter's examples"
+        if self.override:
+            return self.override
+        if chapter not in self.runtimes:
+            entries = [str(directory) for used in self.chapters([chapter])
+                       for directory in [class_dir(self.base, used),
+                                         resource_dir(self.base, used)]
+                       if directory.is_dir()]
+            self.runtimes[chapter] = os.pathsep.join(entries + self.extra)
+        return self.runtimes[chapter]
+
+    def of(self, example):
+        return self.runtime(example.rundir.name)
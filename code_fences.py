@@ -0,0 +1,206 @@
+#! py -3
+"""
+Separate a Markdown chapter's prose from its ``` fenced code listings,
+remembering where every prose line came from, so tools working on the
+prose can still report the chapter line (and column) of what they find.
+
+strip() finds the fences with str.find and copies the prose between them
+as slices. The mapping is an array holding the original line of each
+prose line, so it stays small for the whole book; it and the character
+offsets are derived when needed. Listings can be removed, or blanked to
+keep the line numbers unchanged, and inline `code` spans can be blanked
+too. Its speed is about that of the line loops it replaces ('benchmark'
+compares them); what it adds is the line mapping.
+"""
+import re
+import time
+from array import array
+from bisect import bisect_right
+from functools import cached_property
+from itertools import accumulate
+
+import click
+
+import config
+
+inline_code = re.compile(r"`.*?`", re.DOTALL)
+
+
+def split_lines(text):
+    "Lines without their newlines (only '\\n' ends a line)"
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def fences(text):
+    """
+    [(opening line, closing line)] of each listing, 0-based; the closing
+    line is None if the last listing is never closed
+    """
+    starts = [0] if text.startswith("```") else []  # Offsets of the fence lines
+    position = text.find("\n```")
+    while position >= 0:
+        starts.append(position + 1)
+        position = text.find("\n```", position + 1)
+    found = []
+    start = None
+    line = 0
+    previous = 0
+    for position in starts:
+        line += text.count("\n", previous, position)
+        previous = position
+        if start is None:
+            start = line
+        else:
+            found.append((start, line))
+            start = None
+    if start is not None:
+        found.append((start, None))
+    return found
+
+
+def blank_inline_code(text):
+    "Replace each `code` span with spaces, keeping offsets and newlines"
+    def blank(span):
+        span = span.group()
+        if "\n" in span:
+            return "\n".join(" " * len(line) for line in span.split("\n"))
+        return " " * len(span)
+    return inline_code.sub(blank, text)
+
+
+class Stripped:
+    """
+    The prose of a chapter: lines, text (the lines joined with newlines)
+    and line_of, the 0-based chapter line of each prose line. in_listing
+    has a nonzero byte for each chapter line in (or fencing) a listing.
+    The text, line_of and the character offsets are computed only when
+    first asked for.
+    """
+
+    def __init__(self, chapter_lines, lines, runs, listings, in_listing):
+        self.chapter_lines = chapter_lines
+        self.lines = lines
+        self.runs = runs  # (first chapter line, count) of each run of prose lines
+        self.listings = listings  # As returned by fences()
+        self.in_listing = in_listing
+
+    @cached_property
+    def line_of(self):
+        result = array("q")
+        for first, count in self.runs:
+            result.extend(range(first, first + count))
+        return result
+
+    @cached_property
+    def text(self):
+        return "\n".join(self.lines)
+
+    @cached_property
+    def chapter_starts(self):
+        "Offset of each chapter line in the chapter"
+        lengths = accumulate(map(len, self.chapter_lines), initial=0)
+        return array("q", (total + n for n, total in enumerate(lengths)))
+
+    @cached_property
+    def starts(self):
+        "Offset of each prose line in text"
+        lengths = accumulate(map(len, self.lines), initial=0)
+        return array("q", (total + n for n, total in enumerate(lengths)))
+
+    def offset_of(self, n):
+        "The chapter offset where prose line n starts"
+        return self.chapter_starts[self.line_of[n]]
+
+    def original(self, offset):
+        "(chapter line, column), both 0-based, of an offset in text"
+        n = bisect_right(self.starts, offset) - 1
+        return self.line_of[n], offset - self.starts[n]
+
+    def chapter_offset(self, offset):
+        "The offset in the chapter of an offset in text"
+        n = bisect_right(self.starts, offset) - 1
+        return self.offset_of(n) + offset - self.starts[n]
+
+
+def strip(text, blank_listings=False, inline=False):
+    """
+    Stripped prose of text. blank_listings: listings (fences included)
+    become empty lines rather than disappearing, so prose line n is
+    chapter line n. inline: also blank `code` spans
+    """
+    lines = split_lines(text)
+    listings = fences(text)
+    in_listing = bytearray(len(lines))
+    prose = []
+    runs = []
+    previous = 0
+    for start, end in listings + [(len(lines), len(lines) - 1)]:
+        stop = len(lines) if end is None else end + 1
+        in_listing[start:stop] = b"\1" * (stop - start)
+        prose += lines[previous:start]
+        runs.append((previous, start - previous))
+        if blank_listings:
+            prose += [""] * (stop - start)
+        previous = stop
+    if blank_listings:
+        runs = [(0, len(lines))]
+    stripped = Stripped(lines, prose, runs, listings, in_listing)
+    if inline:
+        stripped.text = blank_inline_code(stripped.text)
+        stripped.lines = stripped.text.split("\n")
+    return stripped
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.option("--runs", "-n", default=5, show_default=True,
+              help="Passes over the book (the best is kept)")
+def benchmark(runs):
+    """
+    Time strip() on every chapter in config.markdown_dir, against the
+    line loop and the whole-text regular expression it replaces
+    """
+    chapters = [md.read_text(encoding="utf-8")
+                for md in sorted(config.markdown_dir.glob("[0-9][0-9]_*.md"))]
+    size = sum(map(len, chapters)) / 1e6
+    listings = re.compile(r"```.*?```", re.DOTALL)
+
+    def line_loop(text):
+        cleaned = []
+        inside_code = False
+        for line in text.splitlines():
+            if line.startswith("```"):
+                inside_code = not inside_code
+            elif not inside_code:
+                cleaned.append(line)
+        return "\n".join(cleaned)
+
+    for name, function in [
+            ("strip", lambda text: strip(text).text),
+            ("strip, blank listings", lambda text: strip(text, blank_listings=True).text),
+            ("strip, blank inline code", lambda text: strip(text, inline=True).text),
+            ("strip, with line mapping", lambda text: strip(text).line_of),
+            ("line loop (no mapping)", line_loop),
+            ("regular expression (no mapping)", lambda text: listings.sub("", text))]:
+        best = float("inf")
+        for n in range(runs):
+            start = time.perf_counter()
+            for chapter in chapters:
+                function(chapter)
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:32} {best * 1000:8.1f} ms  {size / best:6.1f} MB/s")
+
+
+if __name__ == "__main__":
+    cli()
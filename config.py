@@ -46,6 +46,9 @@ metadata = ebookResources / "metadata.yaml"
 
 reformat_dir = rootPath / "Reformatted"
 
+# Survives 'e all' (which erases example_dir) and ebook_build cleans:
+history_dir = rootPath / "ToolHistory"
+
 sample_book_dir = rootPath / "SampleBook"
 sample_book_original_dir = rootPath / "SampleBook" / "Original"
 combined_markdown_sample = sample_book_dir / "onjava-assembled.md"
@@ -0,0 +1,5 @@
+# config needs ONJAVA_TOOLS, which is this directory
+import os
+from pathlib import Path
+
+os.environ.setdefault("ONJAVA_TOOLS", str(Path(__file__).parent))
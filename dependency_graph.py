@@ -0,0 +1,230 @@
+#! py -3
+"""
+Dependency graph of the extracted examples, built from package
+declarations, imports, fully-qualified names and same-package
+references. Maps a set of changed listings to the examples that must
+be recompiled and rerun.
+"""
+import hashlib
+import json
+import re
+from collections import defaultdict
+
+import click
+
+import config
+from directives import maindef
+
+package_statement = re.compile(r"^package\s+([\w.]+)\s*;", re.MULTILINE)
+import_statement = re.compile(
+    r"^import\s+(static\s+)?([\w.]+?)(\.\*)?\s*;", re.MULTILINE)
+type_declaration = re.compile(
+    r"^(?:(?:public|abstract|final|sealed|non-sealed|strictfp)\s+)*"
+    r"(?:class|interface|enum|record|@interface)\s+(\w+)", re.MULTILINE)
+qualified_name = re.compile(r"\b((?:[a-z]\w*\.)+)([A-Z]\w*)")
+identifier = re.compile(r"\b[A-Z]\w*")
+
+snapshot_file = config.history_dir / "source_hashes.json"
+
+
+class SourceFile:
+    def __init__(self, path, base):
+        self.path = path
+        self.relative = path.relative_to(base).as_posix()
+        self.text = path.read_text(errors="replace")
+        found = package_statement.search(self.text)
+        self.package = found.group(1) if found else None
+        # Files in the default package share a namespace per chapter directory:
+        self.unit = self.package or "<" + self.relative.split("/")[0] + ">"
+        self.types = set(type_declaration.findall(self.text)) | {path.stem}
+        self.imports = import_statement.findall(self.text)
+        self.runnable = bool(maindef.search(self.text)) or "{Exec:" in self.text
+
+
+class DependencyGraph:
+
+    def __init__(self, base):
+        self.base = base
+        self.files = {}
+        for java in sorted(base.rglob("*.java")):
+            source = SourceFile(java, base)
+            self.files[source.relative] = source
+        self.units = defaultdict(list)  # package (or chapter) -> files
+        self.type_files = defaultdict(set)  # (unit, type name) -> files
+        for source in self.files.values():
+            self.units[source.unit].append(source.relative)
+            for name in source.types:
+                self.type_files[(source.unit, name)].add(source.relative)
+        self.depends_on = {name: self.find_dependencies(source)
+                           for name, source in self.files.items()}
+        self.dependents = defaultdict(set)
+        for name, dependencies in self.depends_on.items():
+            for dependency in dependencies:
+                self.dependents[dependency].add(name)
+
+    def resolve(self, dotted):
+        "Files for a package name, or for the class a.b.C (or member a.b.C.m)"
+        if dotted in self.units:
+            return set(self.units[dotted])
+        parts = dotted.split(".")
+        for n in range(len(parts) - 1, 0, -1):
+            package, name = ".".join(parts[:n]), parts[n]
+            if (package, name) in self.type_files:
+                return self.type_files[(package, name)]
+        return set()
+
+    def find_dependencies(self, source):
+        result = set()
+        for static, name, wildcard in source.imports:
+            result |= self.resolve(name)
+        for package, name in qualified_name.findall(source.text):
+            result |= self.type_files.get((package.rstrip("."), name), set())
+        for name in set(identifier.findall(source.text)):
+            result |= self.type_files.get((source.unit, name), set())
+        result.discard(source.relative)
+        return result
+
+    def affected(self, changed):
+        "changed listings plus everything that (transitively) depends on them"
+        result = set()
+        pending = [name for name in changed if name in self.files]
+        while pending:
+            name = pending.pop()
+            if name not in result:
+                result.add(name)
+                pending.extend(self.dependents[name])
+        return result
+
+    def transitive_dependencies(self, name):
+        "The listings that name (transitively) depends on, name included"
+        result = set()
+        pending = [name] if name in self.files else []
+        while pending:
+            name = pending.pop()
+            if name not in result:
+                result.add(name)
+                pending.extend(self.depends_on[name])
+        return result
+
+    def chapter_dependencies(self):
+        "{chapter directory: the other chapter directories it (transitively) uses}"
+        direct = defaultdict(set)
+        for name, dependencies in self.depends_on.items():
+            chapter = name.split("/")[0]
+            direct[chapter] |= {dependency.split("/")[0] for dependency in dependencies}
+        result = {}
+        for chapter in direct:
+            used = set()
+            pending = list(direct[chapter])
+            while pending:
+                other = pending.pop()
+                if other not in used and other != chapter:
+                    used.add(other)
+                    pending.extend(direct[other])
+            result[chapter] = used
+        return result
+
+    def affected_runnable(self, changed):
+        return {name for name in self.affected(changed) if self.files[name].runnable}
+
+
+def source_hashes(base):
+    return {java.relative_to(base).as_posix():
+            hashlib.sha256(java.read_bytes()).hexdigest()
+            for java in base.rglob("*.java")}
+
+
+def load_snapshot():
+    "The saved {'hashes': ..., 'dependents': ...}, or None"
+    if not snapshot_file.exists():
+        return None
+    snapshot = json.loads(snapshot_file.read_text())
+    return snapshot if "hashes" in snapshot else None  # Older snapshots held only hashes
+
+
+def changed_since_snapshot(base):
+    """
+    Listings added, changed or deleted since save_snapshot() (all, if
+    there is none). A deleted listing isn't in the graph any more, so
+    the listings that depended on it when the snapshot was saved are
+    included too
+    """
+    current = source_hashes(base)
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return set(current)
+    previous = snapshot["hashes"]
+    changed = {name for name, digest in current.items() if previous.get(name) != digest}
+    for name in previous.keys() - current.keys():
+        changed.add(name)
+        changed |= set(snapshot["dependents"].get(name, [])) & current.keys()
+    return changed
+
+
+def save_snapshot(base, graph=None, pending=()):
+    """
+    Record listing hashes (and who depends on each listing) as the
+    baseline for changed_since_snapshot(). pending: affected examples
+    that a run left out, through patterns or a shard; listings they
+    depend on keep their old entries, so they are still found next time
+    """
+    graph = graph or DependencyGraph(base)
+    previous = load_snapshot() or dict(hashes={}, dependents={})
+    hashes = source_hashes(base)
+    dependents = {name: sorted(graph.dependents[name])
+                  for name in hashes if graph.dependents[name]}
+    pending = set(pending)
+    for name in (hashes.keys() | previous["hashes"].keys()) if pending else ():
+        if previous["hashes"].get(name) == hashes.get(name):
+            continue
+        if name in graph.files:
+            reach = graph.affected_runnable({name})
+        else:  # Deleted
+            reach = graph.affected_runnable(previous["dependents"].get(name, []))
+        if not reach & pending:
+            continue
+        if name in previous["hashes"]:
+            hashes[name] = previous["hashes"][name]
+        else:
+            del hashes[name]
+        if name not in graph.files:
+            dependents[name] = previous["dependents"].get(name, [])
+    config.history_dir.mkdir(parents=True, exist_ok=True)
+    snapshot_file.write_text(json.dumps(dict(hashes=hashes, dependents=dependents), indent=0))
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.argument("changed", nargs=-1)
+def affected(changed):
+    """
+    Show examples to recompile and rerun for CHANGED listings
+    (paths relative to the example directory; default: those changed
+    since the last snapshot)
+    """
+    base = config.example_dir
+    changed = set(changed) or changed_since_snapshot(base)
+    graph = DependencyGraph(base)
+    recompile = graph.affected(changed)
+    rerun = graph.affected_runnable(changed)
+    print(f"{len(changed)} changed, {len(recompile)} to recompile, {len(rerun)} to rerun")
+    for name in sorted(rerun):
+        print(f"    {name}")
+
+
+@cli.command()
+def snapshot():
+    """Record current listing hashes as the baseline for 'changed'"""
+    save_snapshot(config.example_dir)
+
+
+if __name__ == "__main__":
+    cli()
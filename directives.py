@@ -0,0 +1,142 @@
+"""
+Example directives: the '// {Args: ...}', '// {JVMArgs: ...}', '// {Exec: ...}',
+'// {main: ...}' etc. comment lines at the top of each extracted Java file.
+Ported from zzzResidual/Validate.Flags for use by the example runner.
+"""
+import pprint
+import re
+import shlex
+
+maindef = re.compile(r"public\s+static\s+void\s+main")
+
+# Examples carrying any of these tags are never run:
+not_runnable = [
+    "ValidateByHand",
+    "TimeOutDuringTesting",
+    "WillNotCompile",
+    "TimeOut",
+    "RunFirst",
+    "ExcludeFromGradle",
+]
+
+
+class Flags:
+    discard = ["{Requires:"]
+
+    def __init__(self, lines):
+        self.flaglines = []
+        for line in lines:
+            if line.startswith("//"):
+                self.flaglines.append(line)
+            else:
+                break  # Only capture top block
+        self.flaglines = [line for line in self.flaglines if line.startswith("// {")]
+        self.flaglines = [line for line in self.flaglines
+                          if not [d for d in Flags.discard if d in line]]
+        self.flags = dict()
+        for flag in self.flaglines:
+            flag = flag[flag.index("{") + 1: flag.rfind("}")].strip()
+            if ":" in flag:
+                fl, arg = flag.split(":", 1)
+                self.flags[fl.strip()] = arg.strip()
+            else:
+                self.flags[flag] = None  # Make an entry, but no arg
+
+    def __contains__(self, elt):
+        return elt in self.flags
+
+    def __repr__(self):
+        return pprint.pformat(self.flags)
+
+    def __len__(self):
+        return len(self.flaglines)
+
+    def get(self, flag, default=None):
+        return self.flags.get(flag, default)
+
+    def jvm_args(self):
+        return shlex.split(self.flags["JVMArgs"]) if "JVMArgs" in self.flags else []
+
+    def cmd_args(self):
+        return shlex.split(self.flags["Args"]) if "Args" in self.flags else []
+
+
+class RunnableExample:
+    """
+    A Java file with a main() (or an {Exec:}), and everything
+    needed to run it the way the Gradle JavaExec task does.
+    """
+
+    def __init__(self, path, base, body):
+        self.path = path
+        self.name = path.stem
+        self.relative = path.relative_to(base)
+        self.body = body
+        self.lines = body.splitlines()
+        self.flags = Flags(self.lines)
+        self.package = ""
+        for line in self.lines:
+            if line.startswith("package "):
+                self.package = line.split()[1].rstrip(";")
+                break
+        self.main = self.flags.get("main") or self.name
+        # Gradle runs each task in its project (chapter) directory:
+        self.rundir = base / self.relative.parts[0]
+        # The '/* Output:' line starts the .out file, as the Gradle build does:
+        self.output_line = None
+        for line in self.lines:
+            if line.startswith("/* Output:"):
+                self.output_line = line.strip()
+                break
+
+    def __contains__(self, elt):
+        return elt in self.flags
+
+    def __repr__(self):
+        return str(self.relative)
+
+    def main_class(self):
+        return self.package + "." + self.main if self.package else self.main
+
+    def command(self, classpath):
+        "argv for running this example"
+        if "Exec" in self.flags:
+            return shlex.split(self.flags.get("Exec"))
+        return (["java"] + self.flags.jvm_args() +
+                ["-cp", classpath, self.main_class()] + self.flags.cmd_args())
+
+    def manifest_entry(self):
+        "Everything a runner needs, as JSON-ready data (see gradle_tasks.write_manifest)"
+        return dict(
+            name=self.relative.as_posix(),
+            main=self.main_class(),
+            args=self.flags.cmd_args(),
+            jvmArgs=self.flags.jvm_args(),
+            exec=self.command(None) if "Exec" in self.flags else None,
+            workdir=self.relative.parts[0],
+            out=self.relative.with_suffix(".out").as_posix(),
+            err=self.relative.with_suffix(".err").as_posix(),
+            outputLine=self.output_line,
+            ignoreExit="ThrowsException" in self,
+            flags=self.flags.flags,
+        )
+
+    def out_file(self):
+        return self.path.with_suffix(".out")
+
+    def err_file(self):
+        return self.path.with_suffix(".err")
+
+
+def runnable_examples(base):
+    "All examples under base that the Gradle build would run, sorted by path"
+    result = []
+    for java in sorted(base.rglob("*.java")):
+        body = java.read_text(errors="replace")
+        if not (maindef.search(body) or "{Exec:" in body):
+            continue
+        example = RunnableExample(java, base, body)
+        if [tag for tag in not_runnable if tag in example]:
+            continue
+        result.append(example)
+    return result
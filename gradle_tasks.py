@@ -1,22 +1,149 @@
+#! py -3
 """
 Create Gradle Tasks Automatically.
-"""
 
+One JavaExec task per example main(), registered lazily so Gradle only
+configures the tasks a build actually runs. Tasks are written to one
+file per package under gradle/tasks/, applied from gradle/tasks.gradle;
+a package's file is rewritten only when its set of mains changes, so
+Gradle's compiled-script cache stays valid for the rest. Which files
+hold a main() is cached by size and modification time (falling back to
+a content hash), so unchanged listings aren't scanned again.
+
+Alternatively ('create --manifest'), no per-example tasks at all:
+gradle/run_manifest.json describes every runnable example (main class,
+arguments, JVM arguments, working directory, the '/* Output:' line and
+the directive flags), and the single 'runManifest' task runs them all,
+-PrunJobs=N at a time (default: one per processor), each killed after
+-PrunTimeout seconds (default 60). The manifest is plain JSON, for any
+other runner to use:
+
+    {"version": 1, "examples": [{"name": "chapter/Example.java",
+      "main": "package.Example", "args": [], "jvmArgs": [], "exec": null,
+      "workdir": "chapter", "out": "chapter/Example.out",
+      "err": "chapter/Example.err", "outputLine": "/* Output:",
+      "ignoreExit": false, "flags": {...}}, ...]}
+"""
+import hashlib
+import json
+import os
 import re
+import subprocess
+import time
+from collections import defaultdict
+
+import click
 
 import config
+import shards
+from dependency_graph import DependencyGraph, changed_since_snapshot
 from directories import exists
+from directives import runnable_examples
+
+main_pattern = re.compile(r"public\s+static\s+void\s+main")
+package_pattern = re.compile(r"^package\s+([\w.]+)\s*;", re.MULTILINE)
+
+manifest_version = 1
+
+mains_cache = config.history_dir / "gradle_mains.json"
+configuration_times = config.history_dir / "gradle_configuration.jsonl"
+
+
+def tasks_gradle():
+    return config.example_dir / "gradle" / "tasks.gradle"
+
+
+def tasks_dir():
+    return config.example_dir / "gradle" / "tasks"
+
+
+def manifest_file(suffix=""):
+    return config.example_dir / "gradle" / f"run_manifest{suffix}.json"
+
+
+# Defines runFromManifest(File), which runs a manifest's examples the
+# way the JavaExec tasks would, writing the .out and .err files:
+manifest_runner = """
+ext.runFromManifest = { File manifestFile ->
+    def manifest = new groovy.json.JsonSlurper().parse(manifestFile)
+    int jobs = (findProperty('runJobs') ?: Runtime.runtime.availableProcessors()) as int
+    long timeout = (findProperty('runTimeout') ?: 60) as long
+    String javaCommand = "${System.getProperty('java.home')}/bin/java"
+    String classpath = javaClassPath.asPath
+    def failures = Collections.synchronizedList([])
+    def pool = java.util.concurrent.Executors.newFixedThreadPool(jobs)
+    manifest.examples.each { example ->
+        pool.execute {
+            try {
+                def command = example.exec ?: ([javaCommand] + example.jvmArgs +
+                    ['-cp', classpath, example.main] + example.args)
+                File out = file("$rootDir/$example.out")
+                File err = file("$rootDir/$example.err")
+                out.text = example.outputLine ? example.outputLine + '\\n' : ''
+                def process = new ProcessBuilder(command)
+                    .directory(file("$rootDir/$example.workdir"))
+                    .redirectOutput(ProcessBuilder.Redirect.appendTo(out))
+                    .redirectError(err)
+                    .start()
+                String status
+                if (process.waitFor(timeout, java.util.concurrent.TimeUnit.SECONDS)) {
+                    status = "exit ${process.exitValue()}"
+                    if (process.exitValue() != 0 && !example.ignoreExit)
+                        failures << "$example.name ($status)"
+                } else {
+                    process.destroyForcibly().waitFor()
+                    err << "\\n___[ Timed out after $timeout seconds ]___\\n"
+                    status = 'timed out'
+                    failures << "$example.name ($status)"
+                }
+                if (out.length() == 0 || !out.text.contains('/* Output:'))
+                    out.delete()
+                if (err.length() == 0)
+                    err.delete()
+                println "$example.name: $status"
+            } catch (Exception e) {
+                failures << "$example.name ($e)"
+            }
+        }
+    }
+    pool.shutdown()
+    pool.awaitTermination(Long.MAX_VALUE, java.util.concurrent.TimeUnit.SECONDS)
+    if (failures)
+        throw new GradleException("${failures.size()} of ${manifest.examples.size()} " +
+            "examples failed:\\n" + failures.sort().join('\\n'))
+}
+"""
+
+
+def manifest_task(name, suffix=""):
+    return f"""
+task {name} {{
+    inputs.files javaClassPath  // So the classes are compiled first
+    doLast {{
+        runFromManifest(file("$rootDir/gradle/run_manifest{suffix}.json"))
+    }}
+}}
+"""
 
 
-def make_task(task_name, package_name=None):
+def write_manifest(examples, suffix=""):
+    "The run manifest for examples; True if it changed"
+    return write_if_changed(manifest_file(suffix), json.dumps(dict(
+        version=manifest_version,
+        examples=[ex.manifest_entry() for ex in sorted(examples, key=str)]), indent=1))
+
+
+def make_task(task_name, package_name=None, lazy=True):
     if package_name:
         main = f"{package_name}.{task_name}"
     else:
         main = task_name
+    declaration = (f"tasks.register('{task_name}', JavaExec)" if lazy
+                   else f"task {task_name}(type: JavaExec)")
     return (
         task_name,
         f"""
-task {task_name}(type: JavaExec) {{
+{declaration} {{
     classpath javaClassPath
     main = '{main}'
 }}
@@ -24,39 +151,212 @@ task {task_name}(type: JavaExec) {{
     )
 
 
-def create_tasks():
-    tasks = """
-def javaClassPath = sourceSets.main.runtimeClasspath
+def find_mains():
+    """
+    {relative path: package (or None)} for every listing with a main(),
+    reading only files whose size, mtime (and then content) changed
+    """
+    cache = json.loads(mains_cache.read_text()) if mains_cache.exists() else {}
+    updated = {}
+    mains = {}
+    reread = 0
+    for java_file in config.example_dir.rglob("*.java"):
+        relative = java_file.relative_to(config.example_dir).as_posix()
+        stat = java_file.stat()
+        entry = cache.get(relative)
+        if not entry or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+            data = java_file.read_bytes()
+            digest = hashlib.sha1(data).hexdigest()
+            if not entry or entry["digest"] != digest:
+                text = data.decode("utf-8", "ignore")
+                package = package_pattern.search(text)
+                entry = dict(digest=digest, main=bool(main_pattern.search(text)),
+                             package=package.group(1) if package else None)
+                reread += 1
+            entry = dict(entry, size=stat.st_size, mtime=stat.st_mtime_ns)
+        updated[relative] = entry
+        if entry["main"]:
+            mains[relative] = entry["package"]
+    config.history_dir.mkdir(parents=True, exist_ok=True)
+    mains_cache.write_text(json.dumps(updated))
+    print(f"{reread} of {len(updated)} listings scanned for main()")
+    return mains
 
-"""
-    task_dict = {}
+
+def write_if_changed(path, text):
+    "Leave an unchanged file alone, so Gradle needn't recompile the script"
+    if path.exists() and path.read_text() == text:
+        return False
+    path.write_text(text)
+    return True
+
+
+def dependency_list(name, task_names):
+    return (f"\ntask {name} (dependsOn: [\n" +
+            "".join(f"    '{k}',\n" for k in sorted(task_names)) + "    ])\n")
+
+
+def create_tasks(affected=None, shard=None, legacy=False, manifest=False):
+    """
+    affected: optional set of listings (paths relative to example_dir, as
+    produced by dependency_graph.DependencyGraph.affected_runnable());
+    adds a 'runAffected' task that runs only those
+    shard: optional 'i/N' (see shards.py); adds a 'runShard' task that
+    runs only that shard's examples
+    legacy: the previous layout, every task created eagerly in
+    tasks.gradle (to compare configuration times)
+    manifest: run manifests and the single runFromManifest runner
+    instead of per-example tasks
+    """
     print("Creating tasks.gradle ...")
     print(exists(config.example_dir))
-    for java_file in config.example_dir.rglob("*.java"):
-        text = java_file.read_text()
-        lines = text.splitlines()
-        if not re.search(r"public\s+static\s+void\s+main", text):
-            continue
-        package_name = None
-        for line in lines:
-            if line.startswith("package "):
-                package_name = line.split()[1][:-1]
-        k, v = make_task(java_file.stem, package_name)
-        task_dict[k] = v
-    for k in sorted(task_dict):
-        tasks += task_dict[k]
-    tasks += """
-task run (dependsOn: [
-"""
+    if manifest:
+        return create_manifest_tasks(affected, shard)
+    in_shard = set()
+    if shard:
+        in_shard = shards.names(shards.select(runnable_examples(config.example_dir), shard))
+    task_dict = {}
+    affected_tasks = set()
+    shard_tasks = set()
+    for relative, package_name in sorted(find_mains().items()):
+        k, v = make_task(relative.rsplit("/", 1)[-1][:-len(".java")], package_name,
+                         lazy=not legacy)
+        # Files in the default package are grouped by chapter directory:
+        task_dict[k] = (package_name or "default-" + relative.split("/")[0], v)
+        if affected and relative in affected:
+            affected_tasks.add(k)
+        if relative in in_shard:
+            shard_tasks.add(k)
+
+    by_package = defaultdict(list)
     for k in sorted(task_dict):
-        tasks += f"    '{k}',\n"
-    tasks = tasks[:-1]  # Strip last comma
-    tasks += """
-    ]) {
+        by_package[task_dict[k][0]].append(k)
+    tasks = "\next.javaClassPath = sourceSets.main.runtimeClasspath\n\n"
+    if legacy:
+        tasks += "".join(task_dict[k][1] for k in sorted(task_dict))
+    else:
+        tasks_dir().mkdir(exist_ok=True)
+        rewritten = 0
+        for package, names in sorted(by_package.items()):
+            rewritten += write_if_changed(
+                tasks_dir() / f"{package}.gradle",
+                "".join(task_dict[k][1] for k in names))
+            tasks += f"apply from: \"$rootDir/gradle/tasks/{package}.gradle\"\n"
+        remove_stale_task_files(by_package)
+        print(f"{rewritten} of {len(by_package)} package task files rewritten")
+    tasks += dependency_list("run", task_dict).rstrip() + run_complete
+    if affected is not None:
+        tasks += dependency_list("runAffected", affected_tasks)
+    if shard:
+        tasks += f"\n// Shard {shard}:" + dependency_list("runShard", shard_tasks)
+    write_if_changed(tasks_gradle(), tasks)
+    print(f"{len(task_dict)} tasks")
+
+
+run_complete = """ {
     doLast {
         println '*** run complete ***'
     }
 }
 """
-    (config.example_dir / "gradle" / "tasks.gradle").write_text(tasks)
-    print(f"{len(task_dict)} tasks")
+
+
+def remove_stale_task_files(keep=()):
+    if tasks_dir().exists():
+        for stale in tasks_dir().glob("*.gradle"):
+            if stale.stem not in keep:
+                stale.unlink()
+
+
+def create_manifest_tasks(affected, shard):
+    examples = runnable_examples(config.example_dir)
+    changed = write_manifest(examples)
+    tasks = ("\next.javaClassPath = sourceSets.main.runtimeClasspath\n" +
+             manifest_runner + manifest_task("runManifest") +
+             "\ntask run (dependsOn: 'runManifest')" + run_complete)
+    if affected is not None:
+        write_manifest([ex for ex in examples if ex.relative.as_posix() in affected],
+                       "_affected")
+        tasks += manifest_task("runAffected", "_affected")
+    if shard:
+        write_manifest(shards.select(examples, shard), "_shard")
+        tasks += f"\n// Shard {shard}:" + manifest_task("runShard", "_shard")
+    remove_stale_task_files()
+    write_if_changed(tasks_gradle(), tasks)
+    print(f"{len(examples)} examples in {manifest_file().name}"
+          f"{' (changed)' if changed else ''}")
+
+
+def configuration_time(runs, task="compileJava"):
+    "Best wall time of 'gradlew --dry-run task' (configures, executes nothing)"
+    gradlew = str(config.example_dir / "gradlew.bat") if os.name == "nt" else "./gradlew"
+    times = []
+    for n in range(runs):
+        start = time.perf_counter()
+        subprocess.run([gradlew, "--dry-run", "--console=plain", task],
+                       cwd=config.example_dir, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.option("--legacy", is_flag=True,
+              help="Every task created eagerly in gradle/tasks.gradle")
+@click.option("--manifest", is_flag=True,
+              help="gradle/run_manifest.json and one runner task, no per-example tasks")
+@click.option("--affected", "-a", is_flag=True,
+              help="Add a runAffected task: examples affected by listings changed "
+              "since the last clean run")
+@click.option("--shard", default=None, metavar="I/N",
+              help="Add a runShard task for shard I of N (see shards.py)")
+def create(legacy, manifest, affected, shard):
+    """Create or update gradle/tasks.gradle (and gradle/tasks/)"""
+    start = time.perf_counter()
+    if shard:
+        try:
+            shards.parse_spec(shard)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--shard")
+    rerun = None
+    if affected:
+        base = exists(config.example_dir)
+        rerun = DependencyGraph(base).affected_runnable(changed_since_snapshot(base))
+        print(f"{len(rerun)} affected examples")
+    create_tasks(affected=rerun, shard=shard, legacy=legacy, manifest=manifest)
+    print(f"Generated in {time.perf_counter() - start:.2f}s")
+
+
+@cli.command()
+@click.option("--runs", "-n", default=3, show_default=True,
+              help="Configurations timed for each layout (the best is kept)")
+@click.option("--task", "-t", default="compileJava", show_default=True,
+              help="Task whose configuration is timed")
+def measure(runs, task):
+    """
+    Compare Gradle configuration time for the legacy tasks.gradle and
+    the lazy per-package task files, and record both in config.history_dir
+    """
+    results = {}
+    for layout, legacy in [("legacy", True), ("per package", False)]:
+        create_tasks(legacy=legacy)
+        configuration_time(1, task)  # Warm the daemon and compile the scripts
+        results[layout] = configuration_time(runs, task)
+        print(f"{layout}: {results[layout]:.2f}s")
+    config.history_dir.mkdir(parents=True, exist_ok=True)
+    with configuration_times.open("a") as history:
+        history.write(json.dumps(dict(
+            time=time.strftime("%Y-%m-%d %H:%M:%S"), task=task,
+            **{layout: round(seconds, 3) for layout, seconds in results.items()})) + "\n")
+
+
+if __name__ == "__main__":
+    cli()
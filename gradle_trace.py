@@ -0,0 +1,217 @@
+#! py -3
+"""
+Parse the 'gradlew run' console trace (run_trace.txt, written by
+_capture_gradle.bat) into one record per task: example name, start/end,
+duration, outcome, and a summary of any exception. Works on the live
+console (timestamping lines as they arrive) or on a saved trace (no
+timings). Records go to run_trace.jsonl next to the trace.
+"""
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+
+import click
+
+import config
+
+task_header = re.compile(r"^> Task (:[\w:.-]*?)(?: (UP-TO-DATE|NO-SOURCE|SKIPPED|FROM-CACHE|FAILED))?$")
+exception_line = re.compile(
+    r"^(?:Exception in thread \"[^\"]*\" )?((?:[a-z]\w*\.)+[A-Z]\w*(?:Exception|Error)\b.*)$")
+failed_task = re.compile(r"^Execution failed for task '(:[\w:.-]+)'")
+what_went_wrong = "* What went wrong:"
+
+default_trace = "run_trace.txt"
+
+
+class TraceParser:
+    """
+    Feed it console lines; it returns each task's record once the next
+    task (or the end of the build) closes it
+    """
+
+    def __init__(self):
+        self.current = None
+        self.records = {}  # By task path, for attaching failure reports
+        self.in_failure_report = False
+        self.failure_target = None  # Task described by the current report
+
+    def new_record(self, path, outcome, timestamp):
+        return dict(
+            task=path,
+            name=path.split(":")[-1],
+            project=":".join(path.split(":")[:-1]) or ":",
+            outcome=outcome or "EXECUTED",
+            start=timestamp,
+            end=None,
+            duration=None,
+            output_lines=0,
+            exception=None,
+            failure=None,
+        )
+
+    def close_current(self, timestamp):
+        record = self.current
+        self.current = None
+        if record is None:
+            return []
+        if timestamp is not None and record["start"] is not None:
+            record["end"] = timestamp
+            record["duration"] = round(timestamp - record["start"], 3)
+        return [record]
+
+    def feed(self, line, timestamp=None):
+        line = line.rstrip("\r\n")
+        header = task_header.match(line)
+        if header:
+            done = self.close_current(timestamp)
+            self.current = self.new_record(header.group(1), header.group(2), timestamp)
+            self.records[self.current["task"]] = self.current
+            return done
+        if line.startswith(("FAILURE:", "BUILD SUCCESSFUL", "BUILD FAILED")):
+            self.in_failure_report = line.startswith("FAILURE:")
+            return self.close_current(timestamp)
+        if line.strip() == what_went_wrong:
+            self.in_failure_report = True
+            return []
+        if line.startswith("* "):  # '* Try:', '* Get more help ...'
+            self.failure_target = None
+            return []
+        if self.in_failure_report:
+            failed = failed_task.match(line.strip())
+            if failed and failed.group(1) in self.records:
+                record = self.records[failed.group(1)]
+                record["outcome"] = "FAILED"
+                self.failure_target = record
+            elif line.startswith("> ") and self.failure_target:
+                target = self.failure_target
+                target["failure"] = ((target["failure"] + " ") if target["failure"]
+                                     else "") + line[2:].strip()
+            return []
+        if self.current is not None:
+            self.current["output_lines"] += 1
+            found = exception_line.match(line.strip())
+            if found and self.current["exception"] is None:
+                self.current["exception"] = found.group(1)[:200]
+        return []
+
+    def finish(self, timestamp=None):
+        return self.close_current(timestamp)
+
+
+def parse(lines, timed=False):
+    "Generate task records from console lines (timestamped as read if timed)"
+    parser = TraceParser()
+    for line in lines:
+        yield from parser.feed(line, time.time() if timed else None)
+    yield from parser.finish(time.time() if timed else None)
+    # Failure reports come after the tasks they describe; re-emit those:
+    for record in parser.records.values():
+        if record["failure"]:
+            yield dict(record, update=True)
+
+
+def merged(records):
+    "Final state of each task, dropping superseded records"
+    result = {}
+    for record in records:
+        result[record["task"]] = record
+    return list(result.values())
+
+
+def load_records(trace_jsonl):
+    return merged(json.loads(line) for line in trace_jsonl.read_text().splitlines())
+
+
+def missing_out_files(records, base):
+    """
+    Executed example tasks whose .java file has a '/* Output:' section
+    but no .out beside it (other examples don't get a .out)
+    """
+    java_files = defaultdict(list)
+    for java in base.rglob("*.java"):
+        java_files[java.stem].append(java)
+    missing = []
+    for record in records:
+        if record["outcome"] in ("EXECUTED", "FAILED") and record["name"] in java_files:
+            expected = [j for j in java_files[record["name"]]
+                        if "/* Output:" in j.read_text(errors="replace")]
+            if expected and not [j for j in expected if j.with_suffix(".out").exists()]:
+                missing.append(record)
+    return missing
+
+
+def summarize(records, base, top=10):
+    failed = [r for r in records if r["outcome"] == "FAILED"]
+    print(f"{len(records)} tasks, {len(failed)} failed")
+    for record in failed:
+        print(f"    FAILED {record['task']}: {record['exception'] or record['failure']}")
+    timed = sorted((r for r in records if r["duration"] is not None),
+                   key=lambda r: -r["duration"])
+    if timed:
+        print(f"Slowest {min(top, len(timed))} tasks:")
+        for record in timed[:top]:
+            print(f"    {record['duration']:8.2f}s {record['task']}")
+    missing = missing_out_files(records, base)
+    if missing:
+        print(f"{len(missing)} executed tasks produced no .out file:")
+        for record in missing:
+            print(f"    {record['task']}")
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.argument("trace", default=default_trace)
+def parse_file(trace):
+    """Parse a saved trace (relative to the example directory)"""
+    trace = config.example_dir / trace
+    with trace.open(errors="replace") as lines:
+        records = list(parse(lines))
+    with trace.with_suffix(".jsonl").open("w") as out:
+        for record in records:
+            out.write(json.dumps(record) + "\n")
+    summarize(merged(records), config.example_dir)
+
+
+@cli.command()
+@click.argument("trace", default=default_trace)
+def live(trace):
+    """
+    Tee the console from stdin into TRACE, writing timed records as tasks
+    finish (gradlew run 2>&1 | gradle_trace.py live)
+    """
+    trace = config.example_dir / trace
+    records = []
+    with trace.open("w") as raw, trace.with_suffix(".jsonl").open("w") as out:
+
+        def echoed():
+            for line in sys.stdin:
+                raw.write(line)
+                yield line
+
+        for record in parse(echoed(), timed=True):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            records.append(record)
+    summarize(merged(records), config.example_dir)
+
+
+@cli.command()
+@click.argument("trace", default=default_trace)
+def report(trace):
+    """Summarize the records written by parse-file or live"""
+    summarize(load_records((config.example_dir / trace).with_suffix(".jsonl")),
+              config.example_dir)
+
+
+if __name__ == "__main__":
+    cli()
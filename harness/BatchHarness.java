@@ -0,0 +1,198 @@
+// harness/BatchHarness.java
+// Long-lived JVM for warm_jvm.py: runs many example main()s, each in its
+// own class loader, capturing System.out/System.err per invocation.
+// Captured output is bounded as capture.BoundedCapture bounds it, so a
+// runaway example can't exhaust the harness's heap.
+//
+// Usage: java -cp <harness dir> BatchHarness <example classpath> <timeout ms>
+// Requests, one per line on stdin:
+//   id \t headLines \t tailLines \t maxBytes \t mainClass \t arg \t arg ...
+//   (headLines -1: no line limits, just maxBytes)
+// Responses on stdout:
+//   @@RESULT id status <out sizes> <err sizes> \n
+//   followed by the out head and tail bytes, then the err head and tail bytes
+//   sizes: headBytes tailBytes omittedLines droppedBytes
+// status: OK, EXCEPTION (main threw), THREADS (left live non-daemon threads),
+//         TIMEOUT (harness exits afterwards), ERROR (couldn't load/invoke)
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.util.*;
+
+public class BatchHarness {
+  static final PrintStream realErr = System.err;
+  static final OutputStream protocol =
+    new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+
+  static URL[] classpath(String path) throws MalformedURLException {
+    List<URL> urls = new ArrayList<>();
+    for(String entry : path.split(File.pathSeparator))
+      if(!entry.isEmpty())
+        urls.add(new File(entry).toURI().toURL());
+    return urls.toArray(new URL[0]);
+  }
+
+  // Keeps the first headLines and the last tailLines lines (each cut at
+  // maxBytes), or with headLines < 0 the first maxBytes bytes, and counts
+  // what it drops. warm_jvm.py adds the truncation markers.
+  static class CappedOutput extends OutputStream {
+    final int headLines, tailLines, maxBytes;
+    final ByteArrayOutputStream head = new ByteArrayOutputStream();
+    final ArrayDeque<byte[]> tail = new ArrayDeque<>();
+    final ByteArrayOutputStream line = new ByteArrayOutputStream();
+    int headCount = 0;
+    long omittedLines = 0, droppedBytes = 0;
+    String sizes; // Set by finish()
+    CappedOutput(int headLines, int tailLines, int maxBytes) {
+      this.headLines = headLines;
+      this.tailLines = tailLines;
+      this.maxBytes = maxBytes;
+    }
+    @Override
+    public synchronized void write(int b) {
+      write(new byte[] { (byte)b }, 0, 1);
+    }
+    @Override
+    public synchronized void write(byte[] b, int off, int len) {
+      if(headLines < 0) {
+        int keep = Math.max(0, Math.min(len, maxBytes - head.size()));
+        head.write(b, off, keep);
+        droppedBytes += len - keep;
+        return;
+      }
+      int end = off + len;
+      while(off < end) {
+        int newline = off;
+        while(newline < end && b[newline] != '\n')
+          newline++;
+        int keep = Math.max(0, Math.min(newline - off, maxBytes - line.size()));
+        line.write(b, off, keep);
+        droppedBytes += newline - off - keep;
+        if(newline == end)
+          break;
+        endLine();
+        off = newline + 1;
+      }
+    }
+    void endLine() {
+      byte[] bytes = line.toByteArray();
+      line.reset();
+      if(headCount < headLines) {
+        head.write(bytes, 0, bytes.length);
+        head.write('\n');
+        headCount++;
+        return;
+      }
+      if(tailLines == 0) {
+        omittedLines++;
+        return;
+      }
+      tail.addLast(bytes);
+      if(tail.size() > tailLines) {
+        tail.removeFirst();
+        omittedLines++;
+      }
+    }
+    synchronized byte[][] finish() {
+      if(line.size() > 0)
+        endLine();
+      ByteArrayOutputStream kept = new ByteArrayOutputStream();
+      for(byte[] bytes : tail) {
+        kept.write(bytes, 0, bytes.length);
+        kept.write('\n');
+      }
+      byte[][] parts = { head.toByteArray(), kept.toByteArray() };
+      sizes = String.format("%d %d %d %d", parts[0].length,
+        parts[1].length, omittedLines, droppedBytes);
+      return parts;
+    }
+  }
+
+  static Set<Thread> liveNonDaemon() {
+    Set<Thread> live = new HashSet<>();
+    for(Thread t : Thread.getAllStackTraces().keySet())
+      if(t.isAlive() && !t.isDaemon())
+        live.add(t);
+    return live;
+  }
+
+  static void respond(String id, String status,
+    CappedOutput out, CappedOutput err) throws IOException {
+    byte[][] outParts = out.finish();
+    byte[][] errParts = err.finish();
+    protocol.write(String.format("@@RESULT %s %s %s %s%n", id, status,
+      out.sizes, err.sizes)
+      .getBytes(StandardCharsets.UTF_8));
+    for(byte[][] parts : new byte[][][] { outParts, errParts })
+      for(byte[] part : parts)
+        protocol.write(part);
+    protocol.flush();
+  }
+
+  public static void main(String[] args) throws Exception {
+    System.setOut(realErr); // stdout carries only the protocol
+    URL[] urls = classpath(args[0]);
+    long timeoutMillis = Long.parseLong(args[1]);
+    BufferedReader requests = new BufferedReader(
+      new InputStreamReader(System.in, StandardCharsets.UTF_8));
+    String request;
+    while((request = requests.readLine()) != null) {
+      String[] fields = request.split("\t", -1);
+      String id = fields[0];
+      String[] mainArgs = Arrays.copyOfRange(fields, 5, fields.length);
+      int maxBytes = Integer.parseInt(fields[3]);
+      CappedOutput out = new CappedOutput(Integer.parseInt(fields[1]),
+        Integer.parseInt(fields[2]), maxBytes);
+      CappedOutput err = new CappedOutput(-1, 0, maxBytes);
+      String[] status = { "OK" };
+      Set<Thread> before = liveNonDaemon();
+      try(URLClassLoader loader = new URLClassLoader(
+            urls, ClassLoader.getPlatformClassLoader())) {
+        Method main = loader.loadClass(fields[4])
+          .getMethod("main", String[].class);
+        main.setAccessible(true); // Class needn't be public
+        PrintStream stdout = new PrintStream(out, true);
+        PrintStream stderr = new PrintStream(err, true);
+        System.setOut(stdout);
+        System.setErr(stderr);
+        System.setIn(new ByteArrayInputStream(new byte[0]));
+        Thread runner = new Thread(() -> {
+          try {
+            main.invoke(null, (Object)mainArgs);
+          } catch(InvocationTargetException e) {
+            status[0] = "EXCEPTION";
+            stderr.print("Exception in thread \"main\" ");
+            e.getCause().printStackTrace(stderr);
+          } catch(Exception e) {
+            status[0] = "ERROR";
+            e.printStackTrace(stderr);
+          }
+        }, "main");
+        runner.setContextClassLoader(loader);
+        runner.start();
+        runner.join(timeoutMillis);
+        System.out.flush();
+        System.err.flush();
+        if(runner.isAlive()) {
+          respond(id, "TIMEOUT", out, err);
+          Runtime.getRuntime().halt(3);
+        }
+        Set<Thread> after = liveNonDaemon();
+        after.removeAll(before);
+        if(!after.isEmpty())
+          status[0] = "THREADS";
+      } catch(Exception e) {
+        status[0] = "ERROR";
+        e.printStackTrace(new PrintStream(err, true));
+      } finally {
+        // Stray output between invocations must not reach the protocol:
+        System.setOut(realErr);
+        System.setErr(realErr);
+      }
+      respond(id, status[0], out, err);
+      if(status[0].equals("THREADS"))
+        Runtime.getRuntime().halt(4); // Can't reclaim those threads
+    }
+  }
+}
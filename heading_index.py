@@ -0,0 +1,126 @@
+"""
+Index of the book's headings and the identifiers Pandoc gives them, so
+a cross link resolves with one set or dict lookup.
+
+Pandoc links a heading two ways: by identifier, '[text](#some-heading)',
+either the explicit one in '## Heading {#id}' or the one it derives from
+the heading text (auto_identifiers), made unique across the book with
+-1, -2 ... suffixes; and by the heading text itself, '[Some Heading]'
+(implicit_header_references), matched like a reference link label:
+ignoring case and runs of whitespace.
+
+Only the standard library is used, and config only when no Markdown
+directory is given, so the EPUB link checker and the editor plugins can
+use the index too.
+"""
+import re
+from pathlib import Path
+
+chapter_glob = "[0-9][0-9]_*.md"
+
+atx_heading = re.compile(r"#{2,}\s+(.+?)(?:\s+#+)?\s*$")
+attributes = re.compile(r"\s*\{([^{}]*)\}\s*$")
+explicit_id = re.compile(r"(?:^|\s)#([^\s}]+)")
+inline_link = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+emphasis_underscore = re.compile(r"(?<![^\W_])_+|_+(?![^\W_])")
+
+
+def split_attributes(text):
+    "(heading text, explicit identifier or None) for 'Heading {#id .class}'"
+    found = attributes.search(text)
+    if not found:
+        return text.strip(), None
+    ident = explicit_id.search(found.group(1))
+    return text[:found.start()].strip(), ident.group(1) if ident else None
+
+
+def identifier(text):
+    "The identifier Pandoc derives from heading text (auto_identifiers)"
+    text = inline_link.sub(r"\1", text)  # Keep only the text of links
+    text = emphasis_underscore.sub("", text.replace("*", "").replace("`", ""))
+    text = "".join(c for c in text if c.isalnum() or c in "_-." or c.isspace())
+    text = "-".join(text.split()).lower()
+    while text and not text[0].isalpha():  # Identifiers start with a letter
+        text = text[1:]
+    return text or "section"
+
+
+def label(text):
+    "How implicit header references match heading text"
+    return " ".join(text.split()).casefold()
+
+
+def headings(lines):
+    """
+    [(line number, heading text)] for one chapter's lines: '#'-style
+    headings of level two or more, and headings underlined with at least
+    five '=' or '-' (which those in listings aren't: they're skipped)
+    """
+    found = []
+    in_code = False
+    for n, line in enumerate(lines, 1):
+        if line.startswith("```"):
+            in_code = not in_code
+        elif in_code:
+            continue
+        elif line.startswith("##"):
+            atx = atx_heading.match(line)
+            if atx:
+                found.append((n, atx.group(1)))
+        elif re.match("={5,}", line) or re.match("-{5,}", line):
+            previous = lines[n - 2] if n > 1 else ""
+            if re.search(r"\d+", previous) or not re.search(r"\w+", previous):
+                continue
+            found.append((n - 1, previous))
+    return found
+
+
+class HeadingIndex:
+    "Headings by identifier and by label, each -> (chapter, line)"
+
+    def __init__(self, chapters):
+        """
+        chapters: [(chapter name, [(line, heading text)])] in book order,
+        which decides the suffixes of duplicate identifiers
+        """
+        self.identifiers = {}
+        self.labels = {}
+        for chapter, chapter_headings in chapters:
+            for line, text in chapter_headings:
+                self.add(chapter, line, text)
+
+    def add(self, chapter, line, text):
+        text, ident = split_attributes(text)
+        if not ident:
+            ident = base = identifier(text)
+            suffix = 0
+            while ident in self.identifiers:
+                suffix += 1
+                ident = f"{base}-{suffix}"
+        self.identifiers.setdefault(ident, (chapter, line))
+        self.labels.setdefault(label(text), (chapter, line))
+        return ident
+
+    def resolve(self, link):
+        """
+        (chapter, line) of the heading that '[link]' (heading text) or
+        '#link' (identifier) refers to, or None
+        """
+        if link.startswith("#"):
+            return self.identifiers.get(link[1:])
+        return self.labels.get(label(link))
+
+    def __contains__(self, link):
+        return self.resolve(link) is not None
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    @classmethod
+    def from_markdown(cls, markdown_dir=None):
+        "Index the chapters in markdown_dir (default: config.markdown_dir)"
+        if markdown_dir is None:
+            import config
+            markdown_dir = config.markdown_dir
+        return cls((md.name, headings(md.read_text(encoding="utf-8").splitlines()))
+                   for md in sorted(Path(markdown_dir).glob(chapter_glob)))
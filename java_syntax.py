@@ -0,0 +1,181 @@
+#! py -3
+"""
+Fast syntax pre-check of the extracted Java listings, run before
+Gradle: balanced braces, parentheses and brackets, terminated string,
+text-block and char literals and comments, and a slug line naming the
+file. Errors are reported at their Markdown chapter and line.
+
+Results are cached by file content hash in config.history_dir, so only
+changed listings are rescanned; many uncached files are split across
+processes.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+import config
+
+checker_version = "1"  # Change when the checks change, to invalidate the cache
+parallel_threshold = 400  # Uncached files worth starting processes for
+
+token = re.compile(r'''
+    (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<open_comment>/\*)
+  | (?P<text_block>"""[ \t\f]*\n(?:[^"\\]|\\.|"(?!""))*""")
+  | (?P<open_text_block>""")
+  | (?P<string>"(?:[^"\\\n]|\\.)*")
+  | (?P<open_string>")
+  | (?P<char>'(?:[^'\\\n]|\\(?:u+[0-9a-fA-F]{4}|[0-7]{1,3}|[btnfrs"'\\]))')
+  | (?P<bad_char>')
+  | (?P<open>[({\[])
+  | (?P<close>[)}\]])
+''', re.DOTALL | re.VERBOSE)
+
+closer = {"(": ")", "{": "}", "[": "]"}
+
+slug = re.compile(r"^// (\S+\.java)$")
+
+
+def line_of(text, offset):
+    return text.count("\n", 0, offset) + 1
+
+
+def check_text(text, relative):
+    "[(line, message)] for one listing; relative is its posix path"
+    errors = []
+    first = text.split("\n", 1)[0].rstrip("\r")
+    found = slug.match(first)
+    if not found:
+        errors.append((1, f"first line is not a slug line ('// {relative}')"))
+    elif found.group(1) != relative:
+        errors.append((1, f"slug names {found.group(1)}, file is {relative}"))
+    stack = []
+    for match in token.finditer(text):
+        kind = match.lastgroup
+        if kind in ("open_comment", "open_text_block"):
+            what = "comment" if kind == "open_comment" else "text block"
+            errors.append((line_of(text, match.start()), f"unterminated {what}"))
+            break  # The rest of the file is inside it
+        if kind == "open_string":
+            errors.append((line_of(text, match.start()), "unterminated string literal"))
+        elif kind == "bad_char":
+            errors.append((line_of(text, match.start()), "malformed char literal"))
+        elif kind == "open":
+            stack.append((match.group(), match.start()))
+        elif kind == "close":
+            if not stack:
+                errors.append((line_of(text, match.start()),
+                               f"'{match.group()}' without matching opener"))
+            else:
+                opener, start = stack.pop()
+                if closer[opener] != match.group():
+                    errors.append((line_of(text, match.start()),
+                                   f"'{match.group()}' closes '{opener}' from line "
+                                   f"{line_of(text, start)}"))
+    for opener, start in stack:
+        errors.append((line_of(text, start), f"unclosed '{opener}'"))
+    return errors
+
+
+def check_files(batch):
+    "[(digest, relative, errors)] for a batch of (relative, text, digest)"
+    return [(digest, relative, check_text(text, relative))
+            for relative, text, digest in batch]
+
+
+def slug_index(markdown_dir):
+    "{listing path: (chapter file name, Markdown line of its slug line)}"
+    index = {}
+    fence = re.compile(r"^```[^\n]*\n(// (\S+\.java))$", re.MULTILINE)
+    for chapter in sorted(markdown_dir.glob("*.md")):
+        text = chapter.read_bytes().decode("utf-8", "ignore")
+        for found in fence.finditer(text):
+            index[found.group(2)] = (chapter.name, line_of(text, found.start(1)))
+    return index
+
+
+def location(index, relative, line):
+    "chapter.md:line if the listing is known, else the extracted file:line"
+    if relative in index:
+        chapter, start = index[relative]
+        return f"{chapter}:{start + line - 1}"
+    return f"{relative}:{line}"
+
+
+def check_all(base, jobs=None):
+    "{relative path: [(line, message)]} for every listing with errors"
+    known = {}  # relative path -> (digest, errors)
+    cache_file = config.history_dir / f"java_syntax_{base.name}.json"
+    if cache_file.exists():
+        cache = json.loads(cache_file.read_text())
+        if cache.get("version") == checker_version:
+            known = cache["results"]
+    results = {}
+    uncached = []
+    for java in base.rglob("*.java"):
+        data = java.read_bytes()
+        digest = hashlib.sha1(data).hexdigest()
+        relative = java.relative_to(base).as_posix()
+        if relative in known and known[relative][0] == digest:
+            results[relative] = known[relative]
+        else:
+            uncached.append((relative, data.decode("utf-8", "ignore"), digest))
+    if len(uncached) > parallel_threshold:
+        jobs = jobs or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            checked = [item for batch in pool.map(
+                check_files, [uncached[n::jobs] for n in range(jobs)])
+                for item in batch]
+    else:
+        checked = check_files(uncached)
+    for digest, relative, errors in checked:
+        results[relative] = (digest, errors)
+    config.history_dir.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(json.dumps(dict(version=checker_version, results=results)))
+    return {relative: errors for relative, (digest, errors) in results.items() if errors}
+
+
+def report(base, markdown_dir=None):
+    "Print errors at their Markdown locations; returns the number of errors"
+    start = time.perf_counter()
+    errors = check_all(base)
+    index = slug_index(markdown_dir or config.markdown_dir) if errors else {}
+    count = 0
+    for relative in sorted(errors):
+        for line, message in errors[relative]:
+            print(f"{location(index, relative, line)}: {message}")
+            count += 1
+    print(f"Java syntax pre-check of {base.name}: {count} errors "
+          f"in {time.perf_counter() - start:.2f}s")
+    return count
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+def check():
+    """Check the listings in config.example_dir and config.java11_dir"""
+    count = 0
+    for base in [config.example_dir, config.java11_dir]:
+        if base.exists():
+            count += report(base)
+    if count:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
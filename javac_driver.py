@@ -0,0 +1,308 @@
+#! py -3
+"""
+Compile the extracted examples by calling javac directly, without
+configuring the Gradle build. Each compilation unit is one package (or
+a chapter's default package) within one chapter directory; units that
+reference each other are compiled together. Units compile in dependency
+order, independent ones in parallel, into the same
+<chapter>/build/classes/java/main directories Gradle uses, so
+run_examples.py can run the result.
+
+Compiled classes are cached in config.history_dir/javac_cache, keyed by
+a hash of the unit's sources, the keys of the units it depends on, and
+the compiler options. So only changed units and their dependents are
+recompiled, even after 'e all' has erased the build directories.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import click
+
+import config
+from classpath import Classpaths
+from dependency_graph import DependencyGraph
+from directives import Flags
+from directories import exists
+
+cache_dir = config.history_dir / "javac_cache"
+
+# Listings the Gradle build excludes from compilation:
+not_compiled = ["CompileTimeError", "WillNotCompile", "ExcludeFromGradle"]
+
+source_compatibility = re.compile(r"sourceCompatibility\s*=\s*['\"]?([\d.]+)")
+
+
+def class_root(base, chapter):
+    return base / chapter / "build" / "classes" / "java" / "main"
+
+
+def compiler_options(base):
+    "Match the Gradle build's sourceCompatibility, if it sets one"
+    options = ["-encoding", "UTF-8", "-implicit:none"]
+    for build_file in [base / "build.gradle", *sorted((base / "gradle").glob("*.gradle"))]:
+        if build_file.exists():
+            found = source_compatibility.search(build_file.read_text(errors="replace"))
+            if found:
+                return options + ["-source", found.group(1), "-target", found.group(1)]
+    return options
+
+
+class Unit:
+    "The listings of one package in one chapter directory"
+
+    def __init__(self, chapter, package):
+        self.chapter = chapter
+        self.package = package
+        self.name = f"{chapter}:{package or '<default>'}"
+        self.sources = []
+        self.depends_on = set()  # Unit names
+        self.key = None
+
+    def package_path(self):
+        return Path(*self.package.split(".")) if self.package else Path()
+
+    def class_dir(self, base):
+        "Where this unit's classes (and only those) go"
+        return class_root(base, self.chapter) / self.package_path()
+
+    def declares(self, top_level_class):
+        return any(top_level_class in source.types for source in self.sources)
+
+
+class Build:
+
+    def __init__(self, base, jobs, force=False):
+        self.base = base
+        self.jobs = jobs
+        self.force = force
+        self.options = compiler_options(base)
+        graph = DependencyGraph(base)
+        self.units = {}
+        unit_of = {}
+        for name, source in graph.files.items():
+            if [tag for tag in not_compiled if tag in Flags(source.text.splitlines())]:
+                continue
+            chapter = name.split("/")[0]
+            unit = Unit(chapter, source.package)
+            unit = self.units.setdefault(unit.name, unit)
+            unit.sources.append(source)
+            unit_of[name] = unit.name
+        for name, unit_name in unit_of.items():
+            for dependency in graph.depends_on[name]:
+                if dependency in unit_of and unit_of[dependency] != unit_name:
+                    self.units[unit_name].depends_on.add(unit_of[dependency])
+        self.groups = self.merge_cycles()
+        self.classpaths = Classpaths(base, graph)
+
+    def classpath(self, group):
+        """
+        The group's own chapters first, as each Gradle subproject compiles
+        against only its own classes and those of the projects it uses
+        """
+        return self.classpaths.compile(sorted({self.units[name].chapter for name in group}))
+
+    def merge_cycles(self):
+        """
+        Strongly connected components of the unit graph (Tarjan), each a
+        list of unit names: mutually dependent units compile together
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        groups = []
+
+        def visit(name):
+            # Iterative, since chains of units can be long:
+            work = [(name, iter(sorted(self.units[name].depends_on)))]
+            index[name] = low[name] = len(index)
+            stack.append(name)
+            on_stack.add(name)
+            while work:
+                node, edges = work[-1]
+                for dependency in edges:
+                    if dependency not in index:
+                        index[dependency] = low[dependency] = len(index)
+                        stack.append(dependency)
+                        on_stack.add(dependency)
+                        work.append((dependency,
+                                     iter(sorted(self.units[dependency].depends_on))))
+                        break
+                    if dependency in on_stack:
+                        low[node] = min(low[node], index[dependency])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        group = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            group.append(member)
+                            if member == node:
+                                break
+                        groups.append(sorted(group))
+
+        for name in sorted(self.units):
+            if name not in index:
+                visit(name)
+        return groups  # Dependencies before dependents
+
+    def group_dependencies(self, group):
+        members = set(group)
+        return {dependency for name in group
+                for dependency in self.units[name].depends_on} - members
+
+    def compute_key(self, group):
+        digest = hashlib.sha256()
+        digest.update(repr(self.options).encode())
+        for name in group:
+            unit = self.units[name]
+            digest.update(name.encode())
+            for source in sorted(unit.sources, key=lambda s: s.relative):
+                digest.update(source.relative.encode())
+                digest.update(source.text.encode())
+        for dependency in sorted(self.group_dependencies(group)):
+            digest.update(self.units[dependency].key.encode())
+        key = digest.hexdigest()
+        for name in group:
+            self.units[name].key = key
+        return key
+
+    def install(self, group, entry):
+        "Replace the group's classes in the build directories with entry's"
+        for name in group:
+            unit = self.units[name]
+            class_dir = unit.class_dir(self.base)
+            for stale in class_dir.glob("*.class"):
+                stale.unlink()
+        for class_file in entry.rglob("*.class"):
+            relative = class_file.relative_to(entry)
+            chapter, rest = relative.parts[0], Path(*relative.parts[1:])
+            target = class_root(self.base, chapter) / rest
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(class_file, target)
+
+    def owner(self, group, class_file):
+        "The unit in group that a compiled class (relative path) came from"
+        package = ".".join(class_file.parent.parts) or None
+        candidates = [self.units[name] for name in group
+                      if self.units[name].package == package]
+        top_level = class_file.stem.split("$")[0]
+        return next((unit for unit in candidates if unit.declares(top_level)),
+                    candidates[0] if candidates else None)
+
+    def compile_group(self, group, key):
+        "True if compiled, False if installed from the cache, which it updates"
+        entry = cache_dir / key[:2] / key
+        if entry.exists() and not self.force:
+            self.install(group, entry)
+            return False
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=entry.parent))
+        try:
+            output = staging / "javac"
+            proc = subprocess.run(
+                ["javac", "-d", str(output), "-cp", self.classpath(group)] + self.options +
+                [str(source.path) for name in group
+                 for source in self.units[name].sources],
+                capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise CompileError(proc.stdout + proc.stderr)
+            # The cache entry holds <chapter>/<package path>/X.class:
+            classes = staging / "classes"
+            for class_file in output.rglob("*.class"):
+                relative = class_file.relative_to(output)
+                unit = self.owner(group, relative)
+                if unit:
+                    target = classes / unit.chapter / relative
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    class_file.rename(target)
+            classes.mkdir(exist_ok=True)
+            if entry.exists():
+                shutil.rmtree(entry)
+            classes.rename(entry)  # Only complete entries appear
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.install(group, entry)
+        return True
+
+    def run(self):
+        "Compile everything; returns (compiled, from cache, failed) group names"
+        done = set()
+        failed = set()
+        compiled, cached, errors = [], [], {}
+        pending = list(self.groups)
+        group_of = {name: tuple(group) for group in self.groups for name in group}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for group in list(pending):
+                    dependencies = {group_of[d] for d in self.group_dependencies(group)}
+                    if dependencies & failed:
+                        pending.remove(group)
+                        failed.add(tuple(group))
+                        errors[tuple(group)] = "not compiled: a dependency failed"
+                    elif dependencies <= done:
+                        pending.remove(group)
+                        key = self.compute_key(group)
+                        running[pool.submit(self.compile_group, group, key)] = tuple(group)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    group = running.pop(future)
+                    try:
+                        was_compiled = future.result()
+                    except CompileError as e:
+                        failed.add(group)
+                        errors[group] = str(e)
+                        continue
+                    done.add(group)
+                    (compiled if was_compiled else cached).append(group)
+        return compiled, cached, errors
+
+
+class CompileError(Exception):
+    pass
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command("compile")
+@click.option("--jobs", "-j", default=os.cpu_count(), show_default=True,
+              help="javac processes at once")
+@click.option("--force", "-f", is_flag=True, help="Recompile everything")
+def compile_examples(jobs, force):
+    """Compile changed units and their dependents, reusing cached classes"""
+    start = time.perf_counter()
+    build = Build(exists(config.example_dir), jobs, force)
+    print(f"{len(build.units)} units in {len(build.groups)} compilation groups")
+    compiled, cached, errors = build.run()
+    print(f"{len(compiled)} compiled, {len(cached)} from cache, {len(errors)} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    for group, message in sorted(errors.items()):
+        print(f"\n{'=' * 20} {', '.join(group)}\n{message}")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
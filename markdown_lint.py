@@ -0,0 +1,304 @@
+"""
+Single-pass lint engine for the book's Markdown chapters.
+
+Each chapter is read and tokenized once (Chapter): its lines, which of
+them are inside code fences, its headings, [Cross Links] and listing
+comment tags. Chapter rules (registered with @rule) see one Chapter and
+return (line, message) findings; chapters are analysed in parallel.
+Book rules (@book_rule) see only the facts gathered from every chapter
+(headings, links, tags) for checks that span chapters, such as a cross
+link that must match a heading somewhere in the book. Every finding
+carries its chapter and line.
+
+Each chapter's findings and facts are cached in config.history_dir by
+content hash (LintCache), so only changed chapters are analysed again;
+book rules are recomputed from the cached facts.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import code_fences
+import config
+import heading_index
+
+Finding = namedtuple("Finding", "rule chapter line message")
+
+rules_version = "4"  # Change when any rule or Chapter changes, to invalidate the cache
+
+chapter_rules = {}  # Rule name -> function(Chapter) -> [(line, message)]
+book_rules = {}  # Rule name -> function({chapter: facts}) -> [Finding]
+census_rules = set()  # Rules listing what they find, rather than problems
+
+chapter_glob = "[0-9][0-9]_*.md"
+link_pattern = re.compile(r"[^^`]\[.*?\].", re.DOTALL)
+anchor_link = re.compile(r"\]\((#[^)\s]+)\)")
+tag_pattern = re.compile(r"^//\s*\{")
+
+
+def rule(name):
+    "Register a chapter rule"
+    def register(function):
+        chapter_rules[name] = function
+        return function
+    return register
+
+
+def book_rule(name, census=False):
+    """
+    Register a rule over the facts of all chapters. census: it lists what
+    it finds for a person to read, so it isn't run as a check
+    """
+    def register(function):
+        book_rules[name] = function
+        if census:
+            census_rules.add(name)
+        return function
+    return register
+
+
+def checks():
+    "Names of every rule that reports problems"
+    return [name for name in [*chapter_rules, *book_rules] if name not in census_rules]
+
+
+class Chapter:
+    "One Markdown chapter, tokenized once for every rule"
+
+    def __init__(self, name, text):
+        self.name = name
+        # Listings blanked, so prose line numbers are chapter line numbers:
+        self.stripped = code_fences.strip(text, blank_listings=True)
+        self.lines = self.stripped.chapter_lines
+        self.code = self.stripped.in_listing  # For each line: in (or fencing) a listing
+        self.headings = self.find_headings()
+        self.links = self.find_links()
+        self.tags = [(n, line) for n, line in self.numbered() if tag_pattern.search(line)]
+
+    def numbered(self):
+        "(line number, line) for every line"
+        return enumerate(self.lines, 1)
+
+    def prose(self):
+        "(line number, line) outside code fences"
+        return ((n, line) for n, line in self.numbered() if not self.code[n - 1])
+
+    def find_headings(self):
+        "[(line number, heading text, underline or None)]"
+        return [(n, text, None if self.lines[n - 1].startswith("#") else self.lines[n])
+                for n, text in heading_index.headings(self.lines)]
+
+    def find_links(self):
+        """
+        [(line number, link)] outside code: the text of each [Cross Link],
+        and '#id' for each [text](#id)
+        """
+        text = self.stripped.text
+        links = []
+        for found in link_pattern.finditer(text):
+            link = found.group()
+            if link.endswith(("(", "*", "`")) or link.startswith("\\"):
+                continue
+            link = link.strip()
+            if not link.endswith("]"):
+                link = link[:-1]
+            if link.endswith("]]") or "[]" in link:
+                continue
+            links.append((text.count("\n", 0, found.start() + 1) + 1,
+                          " ".join(link[1:-1].split())))
+        for found in anchor_link.finditer(text):
+            links.append((text.count("\n", 0, found.start()) + 1, found.group(1)))
+        return links
+
+    def facts(self):
+        "What book rules need, without the text"
+        return dict(headings=[(n, text) for n, text, underline in self.headings],
+                    links=self.links, tags=self.tags)
+
+
+@rule("underlines")
+def underline_lengths(chapter):
+    "'-' and '=' underlines the same length as their section heads"
+    return [(n + 1, f"underline is {len(underline)} long for a heading of {len(text)}: {text}")
+            for n, text, underline in chapter.headings
+            if underline and len(underline) != len(text)]
+
+
+def broken(line):
+    "Starts or ends with a dash, as broken hyphenation does"
+    return bool(re.match("^-{1,2}[^- ]+", line) or re.search("[^-]+-{1,2}$", line.rstrip()))
+
+
+@rule("dashes")
+def broken_hyphenation(chapter):
+    "No prose lines starting or ending with a dash (broken hyphenation)"
+    return [(n, line) for n, line in chapter.prose() if broken(line)]
+
+
+@rule("trailing-hyphen")
+def trailing_hyphen(chapter):
+    """
+    No lines, listings included, ending with a single hyphen (those
+    found by 'dashes' aren't repeated)
+    """
+    return [(n, line) for n, line in chapter.numbered()
+            if line.rstrip().endswith("-") and not line.rstrip().endswith("--")
+            and (chapter.code[n - 1] or not broken(line))]
+
+
+@rule("blank-output")
+def blank_output_blocks(chapter):
+    "Listings with a '/* Output:' comment but nothing in it"
+    findings = []
+    for n, line in chapter.numbered():
+        if not (chapter.code[n - 1] and line.startswith("/* Output:")):
+            continue
+        output = [line[len("/* Output:"):]]
+        for following in chapter.lines[n:]:
+            if "*/" in output[-1] or following.startswith("```"):
+                break
+            output.append(following)
+        if not "".join(output).replace("*/", "").strip():
+            findings.append((n, "empty output block"))
+    return findings
+
+
+@book_rule("links")
+def links_match_headings(facts):
+    "Every [Cross Link] and [text](#id) resolves to a heading somewhere in the book"
+    index = heading_index.HeadingIndex(
+        (chapter, chapter_facts["headings"]) for chapter, chapter_facts in sorted(facts.items()))
+    return [Finding("links", chapter, n, link)
+            for chapter, chapter_facts in sorted(facts.items())
+            for n, link in chapter_facts["links"] if link not in index]
+
+
+def tag_census(name, facts, keep):
+    "One finding per distinct tag line: its count and first location"
+    counts = Counter()
+    first = {}
+    for chapter, chapter_facts in sorted(facts.items()):
+        for n, line in chapter_facts["tags"]:
+            if keep(line):
+                counts[line] += 1
+                first.setdefault(line, (chapter, n))
+    return [Finding(name, *first[line], f"[{count}]\t{line}")
+            for line, count in sorted(counts.items())]
+
+
+@book_rule("java-tags", census=True)
+def java_bracket_tags(facts):
+    "Census of listing comment tags starting with {java"
+    return tag_census("java-tags", facts, lambda line: "{java" in line)
+
+
+@book_rule("other-tags", census=True)
+def other_bracket_tags(facts):
+    "Census of listing comment tags not starting with {java"
+    return tag_census("other-tags", facts, lambda line: "{java" not in line)
+
+
+class LintCache:
+    """
+    Per-chapter results in config.history_dir, keyed by the chapter's
+    content hash, and discarded entirely when version changes
+    """
+
+    def __init__(self, name, version):
+        self.path = config.history_dir / f"lint_{name}.json"
+        self.version = version
+        self.entries = {}
+        self.hits = 0
+        if self.path.exists():
+            cache = json.loads(self.path.read_text())
+            if cache.get("version") == version:
+                self.entries = cache["chapters"]
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, chapter, digest):
+        "The cached result, or None if chapter changed"
+        entry = self.entries.get(chapter)
+        if entry and entry["digest"] == digest:
+            self.hits += 1
+            return entry["result"]
+        return None
+
+    def put(self, chapter, digest, result):
+        self.entries[chapter] = dict(digest=digest, result=result)
+
+    def save(self, chapters=None):
+        "Write the entries (only those for chapters, if given)"
+        if chapters is not None:
+            self.entries = {name: self.entries[name] for name in chapters
+                            if name in self.entries}
+        config.history_dir.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(dict(version=self.version, chapters=self.entries)))
+
+
+def analyse(name, text):
+    "Findings of every chapter rule, and the facts, for one chapter"
+    chapter = Chapter(name, text)
+    return dict(findings=[(rule_name, n, message)
+                          for rule_name, check in chapter_rules.items()
+                          for n, message in check(chapter)],
+                facts=chapter.facts())
+
+
+def chapters(markdown_dir=None):
+    return sorted((markdown_dir or config.markdown_dir).glob(chapter_glob))
+
+
+def lint(names=None, markdown_dir=None, jobs=None, use_cache=True):
+    "Findings of the named rules (all checks if None), in chapter and line order"
+    names = list(names or checks())
+    paths = chapters(markdown_dir)
+    cache = LintCache("markdown", rules_version) if use_cache else None
+    results = {}
+    uncached = []
+    for path in paths:
+        text = path.read_text(encoding="utf-8")
+        digest = LintCache.digest(text)
+        result = cache.get(path.name, digest) if cache else None
+        if result is None:
+            uncached.append((path.name, text, digest))
+        else:
+            results[path.name] = result
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(uncached) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(uncached))) as pool:
+            analysed = list(pool.map(analyse, *zip(*uncached)))
+    else:
+        analysed = [analyse(name, text) for name, text, digest in uncached]
+    for (name, text, digest), result in zip(uncached, analysed):
+        results[name] = result
+        if cache:
+            cache.put(name, digest, result)
+    if cache:
+        cache.save(results)
+        print(f"{cache.hits} of {len(paths)} chapters unchanged since the last lint")
+    findings = [Finding(rule_name, name, n, message)
+                for name, result in results.items()
+                for rule_name, n, message in result["findings"] if rule_name in names]
+    facts = {name: result["facts"] for name, result in results.items()}
+    for name in names:
+        if name in book_rules:
+            findings += book_rules[name](facts)
+    return sorted(findings, key=lambda f: (names.index(f.rule), f.chapter, f.line))
+
+
+def report(findings):
+    "Print findings grouped by rule; returns how many there were"
+    by_rule = defaultdict(list)
+    for finding in findings:
+        by_rule[finding.rule].append(finding)
+    for name, found in by_rule.items():
+        print(f"*** {name}: {len(found)}")
+        for finding in found:
+            print(f"{finding.chapter}:{finding.line}: {finding.message}")
+    return len(findings)
@@ -0,0 +1,160 @@
+"""
+Compare tabular numeric output (ListPerformance, MapPerformance, etc.).
+
+Timing values change from run to run and machine to machine, so instead
+of throwing away every digit (ignore_digits), parse each table into a
+NumPy array and check that the titles, the shape, the labels, and the
+relative structure of the values still match within a tolerance.
+
+NumPy is optional (pip install numpy, or the pyproject 'tables' extra);
+without it this strategy is skipped, with a warning.
+"""
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+warned = False
+
+number = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?%?")
+
+# mode "ratio": each value, relative to its table's median, may drift by
+#               at most a factor of `tolerance` from the embedded one.
+# mode "order": within each column, values must keep the same rank order.
+# exact_columns: columns (by header name) that are inputs, not measurements,
+#               so must match exactly.
+default_settings = dict(mode="ratio", tolerance=4.0, exact_columns=("size",))
+
+table_examples = {
+    "ListPerformance.java": {},
+    "MapPerformance.java": {},
+    "SetPerformance.java": {},
+    "SynchronizationComparisons.java": dict(tolerance=10.0),
+}
+
+
+def settings_for(java_name):
+    "None if java_name isn't validated as a numeric table"
+    if java_name not in table_examples:
+        return None
+    return dict(default_settings, **table_examples[java_name])
+
+
+def available():
+    "True if NumPy is installed; otherwise warns, the first time"
+    global warned
+    if np is None and not warned:
+        print("Warning: NumPy isn't installed, so numeric_table is skipped")
+        warned = True
+    return np is not None
+
+
+class Table:
+    """
+    Rows with the same number of values, after the text lines (titles)
+    since the previous table; the last of those is the column header
+    """
+
+    def __init__(self, titles, first_label):
+        self.titles = titles
+        self.header = titles[-1] if titles else ""
+        self.labels = [first_label]
+        self.rows = []
+
+    def signature(self):
+        return (tuple(self.titles), tuple(self.labels), len(self.rows[0]))
+
+
+def split_row(line):
+    "(label, values) if line ends with one or more numbers, else None"
+    tokens = line.replace(":", " ").split()
+    values = []
+    while tokens and number.fullmatch(tokens[-1]):
+        values.insert(0, float(tokens.pop().rstrip("%")))
+    if not values or any(number.fullmatch(token) for token in tokens):
+        return None
+    return " ".join(tokens), values
+
+
+def parse_tables(text):
+    "List of Tables found in text; other (non-blank) lines are titles"
+    tables = []
+    current = None
+    titles = []
+    for line in text.splitlines():
+        row = split_row(line)
+        if row is None:
+            if current:
+                current = None
+                titles = []
+            if line.strip():
+                titles.append(" ".join(line.split()))
+            continue
+        label, values = row
+        if current is None or len(values) != len(current.rows[0]):
+            current = Table(titles, label)
+            titles = []
+            tables.append(current)
+        else:
+            current.labels.append(label)
+        current.rows.append(values)
+    return tables
+
+
+def exact_column_mask(table, exact_columns):
+    width = len(table.rows[0])
+    names = ([""] * width + table.header.split())[-width:]
+    return [name in exact_columns for name in names]
+
+
+def tables_match(embedded_output, generated_output, settings):
+    """
+    True if both outputs contain the same tables (titles, labels and
+    shape) and the measured values agree within the settings.
+    """
+    if not available():
+        return False
+    embedded = parse_tables(embedded_output)
+    generated = parse_tables(generated_output)
+    if not embedded:
+        return False
+    if [t.signature() for t in embedded] != [t.signature() for t in generated]:
+        return False
+    # Flatten every table into one vector, with a table index per value,
+    # so all the comparisons happen in a single vectorized pass:
+    exp = np.concatenate([np.asarray(t.rows, dtype=float).ravel() for t in embedded])
+    act = np.concatenate([np.asarray(t.rows, dtype=float).ravel() for t in generated])
+    table_id = np.concatenate(
+        [np.full(len(t.rows) * len(t.rows[0]), n) for n, t in enumerate(embedded)])
+    exact = np.concatenate(
+        [np.tile(exact_column_mask(t, settings["exact_columns"]), len(t.rows))
+         for t in embedded])
+    if not np.array_equal(exp[exact], act[exact]):
+        return False
+    measured = ~exact
+    if settings["mode"] == "order":
+        return all(
+            np.array_equal(np.argsort(e[:, col], kind="stable"),
+                           np.argsort(a[:, col], kind="stable"))
+            for e, a in ((np.asarray(te.rows), np.asarray(ta.rows))
+                         for te, ta in zip(embedded, generated))
+            for col in range(e.shape[1]))
+    exp, act, table_id = exp[measured], act[measured], table_id[measured]
+    if not len(exp):
+        return True
+
+    def relative_log(values):
+        "log of each value relative to its own table's median"
+        values = np.abs(values)
+        floor = np.zeros(len(embedded))
+        scale = np.ones(len(embedded))
+        for n in np.unique(table_id):
+            in_table = values[table_id == n]
+            floor[n] = max(in_table.max() * 1e-3, np.finfo(float).tiny)
+            scale[n] = max(np.median(in_table), floor[n])
+        return np.log(np.maximum(values, floor[table_id]) / scale[table_id])
+
+    drift = np.abs(relative_log(act) - relative_log(exp))
+    return bool(np.all(drift <= np.log(settings["tolerance"])))
@@ -9,6 +9,16 @@ headings and ensuring there are blank lines after various items.
         print(x.encode("windows-1252"))
 """
 
+import config
+import textwrap
+import string
+import os
+import logging
+import time
+import json
+import hashlib
+from collections import Counter, defaultdict
+
 # Very hacky:
 fixes = [
     ("rm-r", "rm -r"),
@@ -19,20 +29,113 @@ fixes = [
     ("n-> n", "n -> n"),
 ]
 
+# Set REFORMAT_TRACE to log every parser decision to trace_file. Tracing
+# and RuleStats wrap the rules only when asked for, so otherwise they
+# cost nothing:
+tracing = bool(os.environ.get("REFORMAT_TRACE"))
+trace_file = __file__.split('.')[0] + ".log"
+
+# The parser's rules, tried in this order on each line:
+rule_names = [
+    "special_line",
+    "subhead",
+    "listing",
+    "table",
+    "bulleted_block",
+    "numbered_block",
+    "blank_lines",
+    "reformat_paragraph",
+]
+
+
+def trace_logger():
+    logger = logging.getLogger("reformat_markdown")
+    if not logger.handlers:
+        logger.addHandler(logging.FileHandler(trace_file, "w", encoding="utf-8"))
+        logger.setLevel(logging.DEBUG)
+    return logger
+
+
+class RuleStats:
+    """
+    Attempts, matches and time of each parser rule, accumulated over
+    every document given this object
+    """
+    def __init__(self):
+        self.attempts = Counter()
+        self.matches = Counter()
+        self.seconds = defaultdict(float)
+
+    def timed(self, name, rule):
+        def timed_rule():
+            start = time.perf_counter()
+            matched = rule()
+            self.seconds[name] += time.perf_counter() - start
+            self.attempts[name] += 1
+            self.matches[name] += bool(matched)
+            return matched
+        return timed_rule
+
+    def report(self):
+        total = sum(self.seconds.values()) or 1
+        lines = ["{:20} {:>9} {:>9} {:>10} {:>6}".format(
+            "rule", "attempts", "matches", "ms", "%")]
+        for name in rule_names:
+            lines.append("{:20} {:9} {:9} {:10.1f} {:6.1f}".format(
+                name, self.attempts[name], self.matches[name],
+                self.seconds[name] * 1000, 100 * self.seconds[name] / total))
+        return "\n".join(lines)
 
-import config
-import textwrap
-import string
-import pprint
-import sys
-import logging
-from logging import debug
-logging.basicConfig(filename= __file__.split('.')[0] + ".log", filemode='w', level=logging.DEBUG)
-#def debug(x): pass # Comment this to produce debug file
 
 subhead_chars = string.ascii_letters + string.digits + "`"
 
-END = "æ" # End sentinel: A character unused in the document
+END = "æ"  # End sentinel: A character unused in the document
+
+
+class ParagraphCache:
+    """
+    Filled paragraphs, keyed by a hash of the formatter settings and the
+    unfilled text, kept in config.history_dir between runs. Nearly every
+    paragraph is already in canonical form, so TextWrapper needn't fill
+    it again.
+    """
+    # Invalidated when the fixes change; change the number when
+    # fill_paragraph does:
+    version = "1:" + hashlib.sha1(repr(fixes).encode()).hexdigest()
+
+    def __init__(self, path=None):
+        self.path = path or config.history_dir / "reformat_paragraphs.json"
+        self.filled = {}
+        self.used = set()
+        if self.path.exists():
+            cache = json.loads(self.path.read_text(encoding="utf-8"))
+            if cache.get("version") == self.version:
+                self.filled = cache["filled"]
+
+    @staticmethod
+    def key(formatter, text):
+        return hashlib.sha1("{}|{}|{}|{}".format(
+            formatter.width, formatter.initial_indent, formatter.subsequent_indent,
+            text).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if key in self.filled:
+            self.used.add(key)
+            return self.filled[key]
+        return None
+
+    def put(self, key, filled):
+        self.filled[key] = filled
+        self.used.add(key)
+
+    def save(self, prune=False):
+        "prune: keep only the paragraphs seen since loading"
+        if prune:
+            self.filled = {key: self.filled[key] for key in self.used}
+        config.history_dir.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(dict(version=self.version, filled=self.filled)),
+                             encoding="utf-8")
+
 
 class MarkdownLines:
     """
@@ -69,13 +172,16 @@ class MarkdownLines:
         else:
             self.end = True
 
-    def blank(self): return len(self.line()) is 0
+    def blank(self):
+        return len(self.line()) == 0
 
-    def nonblank(self): return len(self.line()) is not 0
+    def nonblank(self):
+        return len(self.line()) != 0
 
-    def next_line_blank(self): return len(self.next_line()) is 0
+    def next_line_blank(self):
+        return len(self.next_line()) == 0
 
-    def transfer(self, count = 1):
+    def transfer(self, count=1):
         for _ in range(count):
             if self.not_eof():
                 self.result.append(self.line())
@@ -87,62 +193,95 @@ class ReformatMarkdownDocument(MarkdownLines):
     Reformat an entire document, but only the paragraphs,
     not code or subheads or any other markup.
     """
-    def __init__(self, doc_name, doc_text, width = 80):
+    def __init__(self, doc_name, doc_text, width=80, stats=None, trace=tracing,
+                 cache=None):
         super().__init__(doc_text)
         self.doc_name = doc_name
+        self.cache = cache  # A ParagraphCache, or None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rules = [getattr(self, name) for name in rule_names]
+        if stats is not None:
+            self.rules = [stats.timed(name, rule)
+                          for name, rule in zip(rule_names, self.rules)]
+        if trace:
+            self.rules = [self.traced(name, rule, trace_logger())
+                          for name, rule in zip(rule_names, self.rules)]
         self.normal_formatter = textwrap.TextWrapper(
-            width = width,
-            break_long_words = False,
-            break_on_hyphens = False,
+            width=width,
+            break_long_words=False,
+            break_on_hyphens=False,
         )
         self.indent_formatter = textwrap.TextWrapper(
-            width             = width,
-            break_long_words  = False,
-            break_on_hyphens  = False,
-            initial_indent    = "    ",
-            subsequent_indent = "    ",
+            width=width,
+            break_long_words=False,
+            break_on_hyphens=False,
+            initial_indent="    ",
+            subsequent_indent="    ",
         )
         # Skip header block:
         if self.line() == "---":
             while not self.line().startswith("...") and self.not_eof():
                 self.transfer()
-            self.transfer() # "..."
-
+            self.transfer()  # "..."
 
     def reformat(self):
         # Chain-of-responsibility parser:
+        rules = self.rules
         while self.not_eof():
-            debug("=" * 40)
-            debug("[" + self.doc_name + "] line " +
-                str(self.index) + ": " +
-                str(self.line().encode("windows-1252")))
-            if self.special_line(): continue
-            if self.subhead(): continue
-            if self.listing(): continue
-            if self.table(): continue
-            if self.bulleted_block(): continue
-            if self.numbered_block(): continue
-            if self.blank_lines(): continue
-            if self.reformat_paragraph(): continue
-            raise ValueError("Illegal parser state")
+            for rule in rules:
+                if rule():
+                    break
+            else:
+                raise ValueError("Illegal parser state")
         return "\n".join(self.result)
 
+    def traced(self, name, rule, logger):
+        first = name == rule_names[0]
+
+        def traced_rule():
+            if first:
+                logger.debug("=" * 40)
+                logger.debug("[{}] line {}: {!r}".format(
+                    self.doc_name, self.index, self.line()))
+            matched = rule()
+            logger.debug("{} --> {}".format(name, "success" if matched else "fail"))
+            return matched
+        return traced_rule
+
     def fill_paragraph(self, formatter):
         text = ""
         while self.nonblank() and self.not_eof():
             text += self.line() + " "
             self.increment()
+        if self.cache is None:
+            return self._fill(formatter, text)
+        key = self.cache.key(formatter, text)
+        filled = self.cache.get(key)
+        if filled is None:
+            self.cache_misses += 1
+            filled = self._fill(formatter, text)
+            self.cache.put(key, filled)
+        else:
+            self.cache_hits += 1
+        return filled
+
+    def all_cached(self):
+        "True if every paragraph came from the cache"
+        return self.cache is not None and self.cache_misses == 0
+
+    def _fill(self, formatter, text):
         # Remove double spaces:
-        while text.find("  ") is not -1:
+        while text.find("  ") != -1:
             text = text.replace("  ", " ")
         # Remove spaces around hyphens:
-        while text.find("- ") is not -1:
+        while text.find("- ") != -1:
             text = text.replace("- ", "-")
-        while text.find(" -") is not -1:
+        while text.find(" -") != -1:
             text = text.replace(" -", "-")
         # Hack:
         for fix in fixes:
-            while text.find(fix[0]) is not -1:
+            while text.find(fix[0]) != -1:
                 text = text.replace(fix[0], fix[1])
         return formatter.fill(text)
 
@@ -152,90 +291,66 @@ class ReformatMarkdownDocument(MarkdownLines):
         every line is rstripped, a line that starts with a space is indented
         text and should be passed through untouched.
         """
-        debug("special_line")
         if self.line().startswith((">", "!", "#", "<", " ")):
             self.transfer()
-            debug("--> success")
             return True
-        debug("--> fail")
         return False
 
     def subhead(self):
-        debug("subhead")
         if (self.nonblank() and self.next_line().startswith(("----", "====="))):
-                debug("--> success: " + self.next_line()[0])
-                self.transfer(2)
-                return True
-        debug("--> fail")
+            self.transfer(2)
+            return True
         return False
 
     def listing(self):
         "Skip anything marked as a code listing"
-        debug("listing")
         if self.line().startswith("```"):
             self.transfer()
             while not self.line().startswith("```") and self.not_eof():
                 self.transfer()
-            self.transfer() # for closing ```
-            debug("--> success")
+            self.transfer()  # for closing ```
             return True
-        debug("--> fail")
         return False
 
     def table(self):
         "Skip a markdown table"
-        debug("table")
         if self.line().startswith("+-"):
             self.transfer()
             while self.line().startswith(("|", "+")) and self.not_eof():
                 self.transfer()
-            debug("--> success")
             return True
-        debug("--> fail")
         return False
 
     def bulleted_block(self):
-        debug("bulleted_block")
         if self.line().startswith("+ "):
             formatted = self.fill_paragraph(self.indent_formatter)
             formatted = formatted.replace("+ ", "", 1)
             formatted = formatted.replace("  ", "+ ", 1)
             self.result.append(formatted)
-            debug("--> success:::")
             return True
-        debug("--> fail")
         return False
 
     def numbered_block(self):
-        debug("numbered_block")
         if self.line().startswith(
-            ("0", "1", "2", "3", "4", "5", "6", "7", "8", "9")):
+                ("0", "1", "2", "3", "4", "5", "6", "7", "8", "9")):
             formatted = self.fill_paragraph(self.indent_formatter).lstrip()
             num, par = formatted.split(".", 1)
-            graph = "%-4s" % (num + "." )
+            graph = "%-4s" % (num + ".")
             graph += par.lstrip()
             self.result.append(graph)
-            debug("--> success:::")
             return True
-        debug("--> fail")
         return False
 
     def blank_lines(self):
-        debug("blank_lines")
         if self.nonblank():
-            debug("--> fail")
             return False
         while self.blank() and self.not_eof():
             self.transfer()
-        debug("--> success")
         return True
 
     def reformat_paragraph(self):
         "Reformat a single normal prose markdown paragraph"
-        debug("reformat_paragraph")
-        if self.blank(): # Is this possible?
-            debug("--> fail")
+        if self.blank():  # Is this possible?
             return False
         self.result.append(self.fill_paragraph(self.normal_formatter))
-        debug("--> success")
         return True
@@ -0,0 +1,133 @@
+"""
+Scheduling classes for the example runner.
+
+Benchmarks and concurrency demos give noisier output when other jobs
+compete for the CPU. Those marked '// {ExclusiveCPU}', or listed in
+timing_sensitive, are 'exclusive': pinned to dedicated cores that nothing
+else uses (where taskset can set CPU affinity) or else run one at a
+time after everything else. All other examples form the 'shared' class,
+run on the remaining cores under CPU-time and address-space limits
+(RLIMIT_CPU, RLIMIT_AS), so a runaway example can't starve or swap out the rest.
+
+Both are applied by prefixing the example's command with util-linux's
+prlimit and taskset, which set them and exec the JVM: no Python runs in
+the child between fork and exec, which isn't safe in a threaded parent.
+"""
+import os
+import shutil
+import signal
+from copy import copy
+
+exclusive_tag = "ExclusiveCPU"
+
+# By file name: benchmarks, and the concurrency demos in
+# zzzResidual/output_duet.match_adjustments whose output depends on timing:
+timing_sensitive = {
+    "SimpleMicroBenchmark", "ListPerformance", "MapPerformance",
+    "SetPerformance", "SynchronizationComparisons", "Compete",
+    "MapComparisons", "ListComparisons",
+    "ToastOMatic", "ThreadVariations", "ActiveObjectDemo", "Interrupting",
+    "SyncObject", "WaxOMatic2", "CachedThreadPool", "FixedThreadPool",
+    "MoreBasicThreads", "BankTellerSimulation", "NotifyVsNotifyAll",
+    "SelfManaged", "SimpleThread", "SleepingTask", "ExchangerDemo",
+    "AtomicityTest", "SerialNumberChecker", "EvenSupplier", "SimpleDaemons",
+    "CaptureUncaughtException", "CarBuilder", "PipedIO", "CriticalSection",
+    "ExplicitCriticalSection",
+}
+
+default_cpu_seconds = 300
+# The JVM reserves far more address space than it uses (heap, code cache,
+# class space), so this is generous:
+default_memory_mb = 16 * 1024
+
+
+found_tools = {}
+
+
+def available(tool):
+    "True if tool is on the PATH; otherwise warns (on POSIX), the first time"
+    if tool not in found_tools:
+        found_tools[tool] = shutil.which(tool) is not None
+        if not found_tools[tool] and os.name == "posix":
+            print(f"Warning: {tool} isn't installed, so examples run without it")
+    return found_tools[tool]
+
+
+def exclusive(example):
+    return exclusive_tag in example or example.name in timing_sensitive
+
+
+class Placement:
+    """
+    CPU affinity and resource limits for the processes of one class,
+    set by the taskset and prlimit commands wrapped around each one
+    (where they're installed).
+    """
+
+    def __init__(self, cores=None, cpu_seconds=None, memory_mb=None):
+        self.cores = cores
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+
+    def __repr__(self):
+        cores = f"cores {min(self.cores)}-{max(self.cores)}" if self.cores else "any core"
+        limits = ", ".join(
+            [f"{self.cpu_seconds}s CPU"] * bool(self.cpu_seconds) +
+            [f"{self.memory_mb} MB"] * bool(self.memory_mb))
+        return f"{cores}" + (f", limited to {limits}" if limits else "")
+
+    def without_cpu_limit(self):
+        "For long-lived processes such as the warm JVM harness"
+        result = copy(self)
+        result.cpu_seconds = None
+        return result
+
+    def limits(self):
+        "prlimit options"
+        result = []
+        if self.cpu_seconds:
+            # Soft limit sends SIGXCPU, the hard limit SIGKILL:
+            result.append(f"--cpu={self.cpu_seconds}:{self.cpu_seconds + 5}")
+        if self.memory_mb:
+            result.append(f"--as={self.memory_mb * 1024 * 1024}")
+        return result
+
+    def wrap(self, command):
+        """
+        command prefixed with prlimit and taskset, which apply the placement
+        and exec the rest, so the JVM starts with its CPU mask and limits
+        (and sizes its GC and JIT threads to the mask). The JVM keeps the
+        process, so signals and the exit status are its own.
+        """
+        prefix = []
+        if self.limits() and available("prlimit"):
+            prefix += ["prlimit", *self.limits()]
+        if self.cores and available("taskset"):
+            prefix += ["taskset", "-c", ",".join(str(core) for core in sorted(self.cores))]
+        return prefix + list(command)
+
+    def limit_marker(self, returncode):
+        "Explanation to append to stderr if the process hit its CPU limit"
+        if self.cpu_seconds and hasattr(signal, "SIGXCPU") and (
+                returncode == -signal.SIGXCPU):
+            return f"\n___[ Exceeded CPU limit of {self.cpu_seconds} seconds ]___\n".encode()
+        return b""
+
+
+def plan(examples, exclusive_cores=1, cpu_seconds=default_cpu_seconds,
+         memory_mb=default_memory_mb):
+    """
+    (shared examples, exclusive examples, shared Placement, exclusive
+    Placement or None). None means the exclusive examples must run
+    alone, because cores can't be dedicated to them here.
+    """
+    shared = [ex for ex in examples if not exclusive(ex)]
+    alone = [ex for ex in examples if exclusive(ex)]
+    cores = []
+    if hasattr(os, "sched_getaffinity") and available("taskset"):
+        cores = sorted(os.sched_getaffinity(0))
+    if alone and exclusive_cores and len(cores) > exclusive_cores:
+        return (shared, alone,
+                Placement(set(cores[:-exclusive_cores]), cpu_seconds, memory_mb),
+                Placement(set(cores[-exclusive_cores:])))
+    return shared, alone, Placement(None, cpu_seconds, memory_mb), None
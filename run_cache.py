@@ -0,0 +1,152 @@
+"""
+Cache of captured example output, so unchanged examples needn't be rerun.
+
+The key for an example hashes the class files of its own package and of
+every package it transitively depends on (by dependency_graph.py, and as
+found under the Gradle class directories), its directives, and the JDK
+version. Nondeterministic examples (timing, threads, random numbers,
+dates ...) are never served from the cache.
+"""
+import hashlib
+import json
+import re
+import subprocess
+
+import config
+import dependency_graph
+
+cache_dir = config.history_dir / "run_cache"
+
+nondeterministic_tags = [
+    "Nondeterministic",
+    "VisuallyInspectOutput",
+    "IgnoreOutput",
+]
+
+nondeterministic_patterns = [re.compile(pattern) for pattern in [
+    r"new\s+(?:Random|SplittableRandom)\s*\(\s*\)",
+    r"Math\s*\.\s*random|ThreadLocalRandom|UUID\s*\.\s*randomUUID",
+    r"System\s*\.\s*(?:nanoTime|currentTimeMillis)",
+    r"\b(?:LocalDate|LocalTime|LocalDateTime|ZonedDateTime|Instant|Clock)\s*\.\s*now",
+    r"new\s+Date\s*\(\s*\)|Calendar\s*\.\s*getInstance",
+    r"(?:new|extends)\s+Thread\b|Executor|CompletableFuture|ForkJoinPool",
+    r"\.\s*parallel(?:Stream)?\s*\(",
+    r"\bTimer\b",
+]]
+
+# '/* Output:' tags meaning the stored output is only a sample:
+nondeterministic_output = re.compile(r"\((?:Sample|\d+% Match)\)")
+
+
+def nondeterministic(example):
+    if [tag for tag in nondeterministic_tags if tag in example]:
+        return True
+    if example.output_line and nondeterministic_output.search(example.output_line):
+        return True
+    return any(pattern.search(example.body) for pattern in nondeterministic_patterns)
+
+
+class RunCache:
+
+    def __init__(self, base, force=False):
+        # force: never serve from the cache, but still store fresh results
+        self.force = force
+        self.base = base
+        self._graph = None
+        self.class_roots = sorted(base.glob("*/build/classes/java/main"))
+        self.package_digests = {}
+        self._jdk_version = None
+
+    def jdk_version(self):
+        if self._jdk_version is None:
+            try:
+                proc = subprocess.run(["java", "-version"], capture_output=True)
+                self._jdk_version = proc.stdout + proc.stderr
+            except OSError:
+                self._jdk_version = b"no java"
+        return self._jdk_version
+
+    def package_dirs(self, name):
+        """
+        Class directories for package (or class) name: shorten a.b.C.m
+        until some prefix is a package directory under a class root
+        """
+        parts = name.split(".")
+        while parts:
+            dirs = [root.joinpath(*parts) for root in self.class_roots
+                    if root.joinpath(*parts).is_dir()]
+            if dirs:
+                return dirs
+            parts = parts[:-1]
+        return []
+
+    def package_digest(self, name, rundir=None):
+        "Hash of all class files in a package; the default package is per chapter"
+        key = (name, rundir)
+        if key not in self.package_digests:
+            if name:
+                dirs = self.package_dirs(name)
+            else:
+                dirs = [rundir / "build" / "classes" / "java" / "main"]
+            digest = hashlib.sha256()
+            for package_dir in dirs:
+                for class_file in sorted(package_dir.glob("*.class")):
+                    digest.update(class_file.name.encode())
+                    digest.update(class_file.read_bytes())
+            self.package_digests[key] = digest.hexdigest()
+        return self.package_digests[key]
+
+    def graph(self):
+        if self._graph is None:
+            self._graph = dependency_graph.DependencyGraph(self.base)
+        return self._graph
+
+    def dependencies(self, example):
+        """
+        (package, chapter directory) of every listing the example depends
+        on, directly or not; the chapter directory distinguishes default
+        packages. The example's own package is hashed separately
+        """
+        graph = self.graph()
+        result = set()
+        for name in graph.transitive_dependencies(example.relative.as_posix()):
+            package = graph.files[name].package or ""
+            result.add((package, "" if package else name.split("/")[0]))
+        result.discard((example.package, "" if example.package else example.rundir.name))
+        return sorted(result)
+
+    def key(self, example):
+        digest = hashlib.sha256()
+        digest.update(self.jdk_version())
+        digest.update(repr(sorted(example.flags.flags.items())).encode())
+        digest.update(example.main_class().encode())
+        digest.update(self.package_digest(example.package, example.rundir).encode())
+        for package, chapter in self.dependencies(example):
+            digest.update(f"{package}/{chapter}".encode())
+            digest.update(self.package_digest(package, chapter and self.base / chapter).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def entry(key):
+        return cache_dir / key[:2] / key
+
+    def load(self, example):
+        "(returncode, stdout, stderr) for a cached run, or None"
+        if self.force:
+            return None
+        entry = RunCache.entry(self.key(example))
+        if not (entry / "result.json").exists():
+            return None
+        result = json.loads((entry / "result.json").read_text())
+        return (result["returncode"],
+                (entry / "stdout").read_bytes(), (entry / "stderr").read_bytes())
+
+    def store(self, example, returncode, stdout, stderr):
+        entry = RunCache.entry(self.key(example))
+        entry.mkdir(parents=True, exist_ok=True)
+        (entry / "stdout").write_bytes(stdout)
+        (entry / "stderr").write_bytes(stderr)
+        # Written last, so a partial entry is never loaded:
+        (entry / "result.json").write_text(json.dumps(dict(
+            example=str(example.relative).replace("\\", "/"),
+            returncode=returncode)))
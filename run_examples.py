@@ -0,0 +1,385 @@
+#! py -3
+"""
+Run the compiled examples in config.example_dir on a bounded pool of
+processes, writing .out and .err files where 'gradlew run' puts them.
+Compile first (gradlew compileJava).
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+
+import config
+from directories import exists
+from directives import runnable_examples
+from classpath import Classpaths
+import warm_jvm
+from run_cache import RunCache, nondeterministic
+import dependency_graph
+import telemetry
+import capture
+import resource_classes
+import shards
+from scheduler import Schedule, packing_report
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+class RunResult:
+    def __init__(self, example, returncode, stdout, stderr, wall,
+                 timed_out=False, cached=False, rusage=None):
+        self.example = example
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.wall = wall
+        self.timed_out = timed_out
+        self.cached = cached
+        self.rusage = rusage  # From os.wait4(), where available
+
+    def failed(self):
+        if self.timed_out:
+            return True
+        return self.returncode != 0 and "ThrowsException" not in self.example
+
+    def __repr__(self):
+        status = "timed out" if self.timed_out else f"exit {self.returncode}"
+        if self.cached:
+            return f"{self.example} ({status}, cached)"
+        return f"{self.example} ({status}, {self.wall:.2f}s)"
+
+
+def timeout_marker(timeout):
+    return f"\n___[ Timed out after {timeout} seconds ]___\n".encode()
+
+
+def wait(proc):
+    "Reap proc, returning its resource usage where the OS reports it"
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None
+    pid, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+def kill_tree(proc):
+    "Kill proc and anything it started (which may hold its output pipes open)"
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        proc.kill()
+
+
+def run_example(example, classpath, timeout, placement=None):
+    "placement: optional resource_classes.Placement (CPU affinity and limits)"
+    start = time.perf_counter()
+    try:
+        command = example.command(classpath)
+        proc = subprocess.Popen(
+            placement.wrap(command) if placement else command, cwd=example.rundir,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, start_new_session=hasattr(os, "killpg"))
+    except OSError as e:
+        return RunResult(example, None, b"", str(e).encode() + b"\n",
+                         time.perf_counter() - start)
+    out = capture.for_output_line(example.output_line)
+    err = capture.BoundedCapture()
+    readers = [threading.Thread(target=captured.drain, args=(stream,))
+               for captured, stream in [(out, proc.stdout), (err, proc.stderr)]]
+    for reader in readers:
+        reader.start()
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        kill_tree(proc)
+
+    killer = threading.Timer(timeout, kill)
+    killer.start()
+    rusage = wait(proc)
+    killer.cancel()
+    for reader in readers:
+        reader.join()
+    proc.stdout.close()
+    proc.stderr.close()
+    wall = time.perf_counter() - start
+    if timed_out.is_set():
+        return RunResult(example, None, out.result(),
+                         err.result() + timeout_marker(timeout), wall,
+                         timed_out=True, rusage=rusage)
+    stderr = err.result()
+    if placement:
+        stderr += placement.limit_marker(proc.returncode)
+    return RunResult(example, proc.returncode, out.result(), stderr,
+                     wall, rusage=rusage)
+
+
+def write_outputs(result):
+    """
+    Write .out (headed by the '/* Output:' line, and only if there is one)
+    and .err (only if non-empty), leaving the files Gradle would
+    """
+    example = result.example
+    if example.output_line:
+        example.out_file().write_bytes(example.output_line.encode() + b"\n" + result.stdout)
+    elif example.out_file().exists():
+        example.out_file().unlink()
+    if result.stderr:
+        example.err_file().write_bytes(result.stderr)
+    elif example.err_file().exists():
+        example.err_file().unlink()
+
+
+def select(examples, patterns):
+    "Examples whose relative path contains any of patterns (all if none)"
+    if not patterns:
+        return examples
+    return [ex for ex in examples
+            if [p for p in patterns if p in str(ex.relative).replace("\\", "/")]]
+
+
+def run_warm(examples, classpaths, timeout, placement=None):
+    "Run examples sharing a rundir in one harness JVM, forking any it hands back"
+    results = []
+    classpath = classpaths.of(examples[0])
+    with warm_jvm.Harness(examples[0].rundir, classpath, timeout,
+                          placement and placement.without_cpu_limit()) as harness:
+        for example in examples:
+            outcome = harness.run(example)
+            if outcome is None:
+                results.append(run_example(example, classpath, timeout, placement))
+                continue
+            returncode, stdout, stderr, wall, timed_out = outcome
+            if timed_out:
+                stderr += timeout_marker(timeout)
+            results.append(
+                RunResult(example, returncode, stdout, stderr, wall, timed_out))
+    return results
+
+
+def warm_batches(examples):
+    """
+    Split examples into those run forked, and batches for the warm JVM
+    (same rundir, so the same chapter classpath, at most warm_batch_size
+    each, so batches still spread across the pool)
+    """
+    forked = [ex for ex in examples if warm_jvm.needs_fresh_jvm(ex)]
+    by_rundir = defaultdict(list)
+    for ex in examples:
+        if not warm_jvm.needs_fresh_jvm(ex):
+            by_rundir[ex.rundir].append(ex)
+    batches = [group[i:i + warm_batch_size]
+               for group in by_rundir.values()
+               for i in range(0, len(group), warm_batch_size)]
+    return forked, batches
+
+
+warm_batch_size = 25
+
+
+def from_cache(examples, cache):
+    """
+    Write outputs for deterministic examples with a cache hit.
+    Returns (their results, the examples still to run)
+    """
+    results = []
+    to_run = []
+    for example in examples:
+        hit = None if nondeterministic(example) else cache.load(example)
+        if hit is None:
+            to_run.append(example)
+            continue
+        result = RunResult(example, *hit, 0.0, cached=True)
+        write_outputs(result)
+        results.append(result)
+    return results, to_run
+
+
+def cacheable(result):
+    """
+    Only runs that succeeded are cached: a failure may be transient, or
+    caused by the --cpu-limit/--memory-limit, which aren't in the key.
+    A {ThrowsException} example may exit nonzero, but not fail to start
+    or be killed by a signal
+    """
+    if result.failed() or result.returncode is None:
+        return False
+    return result.returncode >= 0
+
+
+def finish(result, cache=None):
+    "Write the outputs of a completed run, cache them if deterministic, and report"
+    write_outputs(result)
+    if cache and cacheable(result) and not nondeterministic(result.example):
+        cache.store(result.example, result.returncode, result.stdout, result.stderr)
+    print(("FAILED " if result.failed() else "") + repr(result))
+
+
+def run_job(job, classpaths, timeout, placement=None):
+    "Results for a single example, or for a warm JVM batch (a list)"
+    if isinstance(job, list):
+        return run_warm(job, classpaths, timeout, placement)
+    return [run_example(job, classpaths.of(job), timeout, placement)]
+
+
+def run_all(examples, classpaths, jobs, timeout, warm=False, cache=None,
+            schedule=None, classes=None):
+    """
+    With a schedule, start the longest jobs first (otherwise in the
+    order given), and report predicted vs actual makespan.
+    classes: keyword arguments for resource_classes.plan(), to run
+    exclusive examples on dedicated cores (or alone, afterwards) and the
+    rest under resource limits
+    """
+    results = []
+    if cache:
+        results, examples = from_cache(examples, cache)
+        print(f"{len(results)} served from cache, {len(examples)} to run")
+    alone, shared_placement, exclusive_placement = [], None, None
+    if classes is not None:
+        examples, alone, shared_placement, exclusive_placement = \
+            resource_classes.plan(examples, **classes)
+        print(f"Shared: {len(examples)} on {shared_placement}; exclusive: {len(alone)} "
+              + (f"on {exclusive_placement}" if exclusive_placement else "run alone"))
+    if warm:
+        forked, batches = warm_batches(examples)
+        print(f"{len(forked)} forked, {len(examples) - len(forked)} in "
+              f"{len(batches)} warm JVM batches")
+        work = batches + forked
+    else:
+        work = list(examples)
+    if schedule:
+        work = schedule.longest_first(work)
+        alone = schedule.longest_first(alone)
+        shared_span = schedule.makespan(work, jobs)
+        alone_span = schedule.makespan(alone, 1)
+        schedule.predicted_makespan = (max(shared_span, alone_span) if exclusive_placement
+                                       else shared_span + alone_span)
+        print(f"Longest first; predicted makespan {schedule.predicted_makespan:.1f}s "
+              f"({len(schedule.estimated)} examples without history estimated)")
+    start = time.perf_counter()
+    ran = []
+    with ThreadPoolExecutor(max_workers=jobs) as pool, \
+            ThreadPoolExecutor(max_workers=1) as dedicated:
+        # The pools' queues are FIFO, so jobs start in submission order:
+        futures = [pool.submit(run_job, job, classpaths, timeout, shared_placement)
+                   for job in work]
+        if exclusive_placement:
+            futures += [dedicated.submit(run_job, ex, classpaths, timeout,
+                                         exclusive_placement) for ex in alone]
+        for future in as_completed(futures):
+            for result in future.result():
+                finish(result, cache)
+                ran.append(result)
+    if alone and not exclusive_placement:
+        print(f"Running {len(alone)} exclusive examples alone")
+        for example in alone:
+            result = run_example(example, classpaths.of(example), timeout)
+            finish(result, cache)
+            ran.append(result)
+    if schedule and ran:
+        print(packing_report(schedule.predicted_makespan, time.perf_counter() - start,
+                             [r.wall for r in ran], jobs + bool(exclusive_placement)))
+    return results + ran
+
+
+def summarize(results, wall):
+    "Print the totals and any failures; returns the failures"
+    failures = sorted((r for r in results if r.failed()), key=lambda r: str(r.example))
+    print(f"\n{len(results)} examples in {wall:.1f}s, {len(failures)} failed")
+    for failure in failures:
+        print(f"    {failure}")
+    return failures
+
+
+@cli.command()
+@click.option("--jobs", "-j", default=os.cpu_count(), show_default=True,
+              help="Number of examples to run at once")
+@click.option("--timeout", "-t", default=60.0, show_default=True,
+              help="Seconds before an example is killed")
+@click.option("--classpath", "-c", default=None,
+              help="Override the classpath found under the example directory")
+@click.option("--warm", "-w", is_flag=True,
+              help="Run most examples in long-lived JVMs (see warm_jvm.py)")
+@click.option("--force", "-f", is_flag=True,
+              help="Run everything, even examples with cached results")
+@click.option("--no-cache", is_flag=True, help="Neither use nor update the cache")
+@click.option("--affected", "-a", is_flag=True,
+              help="Only examples affected by listings changed since the last clean run")
+@click.option("--max-output", default=capture.max_output_bytes, show_default=True,
+              help="Bytes kept from each output stream (see capture.py)")
+@click.option("--fifo", is_flag=True,
+              help="Start examples in directory order, not longest first")
+@click.option("--shard", default=None, metavar="I/N",
+              help="Run only shard I of N and write its bundle (see shards.py)")
+@click.option("--exclusive-cores", default=1, show_default=True,
+              help="Cores dedicated to {ExclusiveCPU} examples (0: run them alone, last)")
+@click.option("--cpu-limit", default=resource_classes.default_cpu_seconds,
+              show_default=True, help="CPU seconds for each shared example (0: no limit)")
+@click.option("--memory-limit", default=resource_classes.default_memory_mb,
+              show_default=True, help="Address space MB for each shared example (0: no limit)")
+@click.argument("patterns", nargs=-1)
+def run(jobs, timeout, classpath, warm, force, no_cache, affected, max_output,
+        fifo, shard, exclusive_cores, cpu_limit, memory_limit, patterns):
+    """
+    Run examples (those whose path contains any of PATTERNS, or all)
+    """
+    capture.max_output_bytes = max_output
+    base = exists(config.example_dir)
+    examples = everything = runnable_examples(base)
+    if shard:
+        try:
+            examples = shards.select(examples, shard)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--shard")
+    examples = select(examples, patterns)
+    if affected:
+        graph = dependency_graph.DependencyGraph(base)
+        rerun = graph.affected_runnable(dependency_graph.changed_since_snapshot(base))
+        examples = [ex for ex in examples if ex.relative.as_posix() in rerun]
+        running = {ex.relative.as_posix() for ex in examples}
+        # Affected, but left out by the shard or patterns:
+        pending = {ex.relative.as_posix() for ex in everything} & rerun - running
+        if pending:
+            print(f"{len(pending)} affected examples aren't in this run; "
+                  "they stay affected for the next --affected run")
+    classpaths = Classpaths(base, override=classpath)
+    print(f"Running {len(examples)} examples, {jobs} at a time")
+    start = time.perf_counter()
+    cache = None if no_cache else RunCache(base, force)
+    schedule = None if fifo else Schedule(examples)
+    classes = dict(exclusive_cores=exclusive_cores, cpu_seconds=cpu_limit,
+                   memory_mb=memory_limit)
+    results = run_all(examples, classpaths, jobs, timeout, warm, cache, schedule, classes)
+    predicted = schedule.predicted_makespan if schedule else None
+    if shard:
+        # History is added by 'shards.py merge', so every shard partitions alike:
+        shards.write_bundle(shard, examples, results, time.perf_counter() - start,
+                            jobs, predicted)
+    else:
+        telemetry.append_run(results, time.perf_counter() - start, jobs, predicted)
+    if summarize(results, time.perf_counter() - start):
+        sys.exit(1)
+    if affected:
+        dependency_graph.save_snapshot(base, graph, pending)  # Baseline for the next --affected
+
+
+if __name__ == "__main__":
+    cli()
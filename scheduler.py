@@ -0,0 +1,81 @@
+"""
+Longest-job-first ordering for the example runner.
+
+Jobs (single examples, or warm JVM batches) are started longest first,
+using each example's last recorded wall time (telemetry.py). Examples
+with no history are estimated from their chapter, bumped for code that
+usually runs long. The schedule also predicts the makespan (total wall
+time) for a given number of workers, for comparison with the actual run.
+"""
+import heapq
+import re
+import statistics
+from collections import defaultdict
+
+import telemetry
+
+default_duration = 1.0  # Seconds, when there's no history at all
+
+slow_patterns = [re.compile(pattern) for pattern in [
+    r"\bsleep\s*\(|TimeUnit\s*\.\s*\w+\s*\.\s*sleep",
+    r"(?:new|extends)\s+Thread\b|Executor|CompletableFuture|ForkJoinPool",
+    r"\.\s*parallel(?:Stream)?\s*\(",
+    r"\bTimer\b|\bCountDownLatch\b|\bCyclicBarrier\b",
+]]
+slow_factor = 3.0
+
+
+class Schedule:
+
+    def __init__(self, examples, durations=None):
+        self.durations = telemetry.last_durations() if durations is None else durations
+        by_chapter = defaultdict(list)
+        for name, wall in self.durations.items():
+            by_chapter[name.split("/")[0]].append(wall)
+        self.chapter_medians = {chapter: statistics.median(walls)
+                                for chapter, walls in by_chapter.items()}
+        self.overall_median = (statistics.median(self.durations.values())
+                               if self.durations else default_duration)
+        self.predicted = {ex.relative.as_posix(): self.predict(ex) for ex in examples}
+        self.estimated = [ex for ex in examples
+                          if ex.relative.as_posix() not in self.durations]
+        self.predicted_makespan = None  # Set by the runner
+
+    def predict(self, example):
+        "Last recorded wall time, or a heuristic estimate for a new example"
+        name = example.relative.as_posix()
+        if name in self.durations:
+            return self.durations[name]
+        estimate = self.chapter_medians.get(name.split("/")[0], self.overall_median)
+        if [p for p in slow_patterns if p.search(example.body)]:
+            estimate *= slow_factor
+        return estimate
+
+    def cost(self, job):
+        "Predicted seconds for an example, or for a batch (list) of them"
+        if isinstance(job, list):
+            return sum(self.cost(ex) for ex in job)
+        return self.predicted[job.relative.as_posix()]
+
+    def longest_first(self, jobs):
+        return sorted(jobs, key=lambda job: -self.cost(job))
+
+    def makespan(self, jobs, workers):
+        "Predicted wall time for jobs started longest first on workers"
+        loads = [0.0] * max(workers, 1)
+        for job in self.longest_first(jobs):
+            heapq.heapreplace(loads, loads[0] + self.cost(job))
+        return max(loads)
+
+
+def packing_report(predicted, actual, walls, workers):
+    """
+    Predicted vs actual makespan, the best possible makespan for the
+    actual wall times, and packing efficiency: the fraction of
+    workers x makespan spent running examples
+    """
+    busy = sum(walls)
+    lower_bound = max(busy / max(workers, 1), max(walls, default=0.0))
+    efficiency = busy / (workers * actual) if actual else 0.0
+    return (f"Makespan: predicted {predicted:.1f}s, actual {actual:.1f}s, "
+            f"lower bound {lower_bound:.1f}s; packing efficiency {efficiency:.0%}")
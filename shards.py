@@ -0,0 +1,209 @@
+#! py -3
+"""
+Deterministic static sharding of the example run, for CI matrices.
+
+'--shard i/N' (1 <= i <= N) selects one of N parts of the runnable
+examples, balanced by predicted run time (scheduler.py) and assigned
+longest first, ties broken by path. Every machine must see the same
+listings and the same run history (restore config.history_dir from a
+shared cache) to agree on the partition; 'merge' reports any example
+missing from, or duplicated across, the bundles it is given.
+
+Each shard writes a result bundle directory: the .out/.err files it
+produced, its results and telemetry, and (after '_verify_output.py -h')
+its verification results. 'merge' puts those back into one tree with the
+same telemetry history and verified_output.txt as a single-machine run.
+"""
+import heapq
+import json
+import shutil
+import sys
+from collections import Counter
+from pathlib import Path
+
+import click
+
+import config
+from directories import exists
+from directives import runnable_examples
+from scheduler import Schedule
+import telemetry
+
+bundle_root = config.history_dir / "shards"
+
+
+def parse_spec(spec):
+    "'i/N' as (i, N); raises ValueError for anything else"
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, not '{spec}'")
+    if not 1 <= index <= count:
+        raise ValueError(f"shard {spec}: need 1 <= i <= N")
+    return index, count
+
+
+def partition(examples, count, schedule=None):
+    "examples split into count lists, balanced by predicted duration"
+    schedule = schedule or Schedule(examples)
+    parts = [[] for n in range(count)]
+    loads = [(0.0, n) for n in range(count)]  # Heap of (load, shard index)
+    for example in sorted(examples, key=lambda ex: (-schedule.cost(ex),
+                                                    ex.relative.as_posix())):
+        load, n = heapq.heappop(loads)
+        parts[n].append(example)
+        heapq.heappush(loads, (load + schedule.cost(example), n))
+    return [sorted(part, key=lambda ex: ex.relative.as_posix()) for part in parts]
+
+
+def select(examples, spec):
+    "The examples in shard spec ('i/N')"
+    index, count = parse_spec(spec)
+    return partition(examples, count)[index - 1]
+
+
+def names(examples):
+    return {ex.relative.as_posix() for ex in examples}
+
+
+def bundle_dir(spec):
+    index, count = parse_spec(spec)
+    return bundle_root / f"shard-{index}-of-{count}"
+
+
+def write_bundle(spec, examples, results, total_wall, jobs, predicted=None):
+    "Result bundle for one shard, replacing any earlier one"
+    bundle = bundle_dir(spec)
+    if bundle.exists():
+        shutil.rmtree(bundle)
+    outputs = bundle / "outputs"
+    for result in results:
+        for produced in [result.example.out_file(), result.example.err_file()]:
+            if produced.exists():
+                target = outputs / produced.relative_to(config.example_dir)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(produced, target)
+    (bundle / "results.json").write_text(json.dumps(dict(
+        shard=spec,
+        examples=sorted(names(examples)),
+        results=[dict(example=r.example.relative.as_posix(),
+                      returncode=r.returncode, wall=round(r.wall, 3),
+                      timed_out=r.timed_out, cached=r.cached, failed=r.failed())
+                 for r in results]), indent=1))
+    with (bundle / "telemetry.jsonl").open("w") as history:
+        for entry in telemetry.run_records(bundle.name, results, total_wall, jobs,
+                                           predicted):
+            history.write(json.dumps(entry) + "\n")
+    print(f"Shard {spec} bundle: {bundle}")
+    return bundle
+
+
+def write_verification(spec, by_strategy):
+    "Add _verify_output results ({strategy: [java files]}) to a shard's bundle"
+    bundle = bundle_dir(spec)
+    bundle.mkdir(parents=True, exist_ok=True)
+    (bundle / "verified_output.json").write_text(json.dumps(by_strategy, indent=1))
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.argument("count", type=int)
+def show(count):
+    """Show the partition of the runnable examples into COUNT shards"""
+    examples = runnable_examples(exists(config.example_dir))
+    schedule = Schedule(examples)
+    for n, part in enumerate(partition(examples, count, schedule), 1):
+        print(f"{n}/{count}: {len(part)} examples, "
+              f"predicted {sum(schedule.cost(ex) for ex in part):.1f}s")
+
+
+@cli.command()
+@click.argument("bundles", nargs=-1, type=click.Path(exists=True, file_okay=False))
+def merge(bundles):
+    """
+    Combine shard BUNDLES (default: all under config.history_dir/shards)
+    into the example tree, telemetry history and verified_output.txt
+    """
+    import _verify_output
+    bundles = [Path(b) for b in bundles] or sorted(bundle_root.glob("shard-*-of-*"))
+    if not bundles:
+        sys.exit(f"No bundles in {bundle_root}")
+    base = exists(config.example_dir)
+    expected = set()
+    specs = set()
+    produced = []
+    results = []
+    entries = []
+    verified = None  # Until a bundle has verification results
+    cycles = []
+    for bundle in bundles:
+        summary = json.loads((bundle / "results.json").read_text())
+        specs.add(parse_spec(summary["shard"]))
+        expected |= set(summary["examples"])
+        produced += [r["example"] for r in summary["results"]]
+        results += summary["results"]
+        # As in a single-machine run, an example leaves only the files it produced:
+        for name in summary["examples"]:
+            for suffix in [".out", ".err"]:
+                stale = (base / name).with_suffix(suffix)
+                if stale.exists():
+                    stale.unlink()
+        outputs = bundle / "outputs"
+        for output in outputs.rglob("*"):
+            if output.is_file():
+                target = base / output.relative_to(outputs)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(output, target)
+        for line in (bundle / "telemetry.jsonl").read_text().splitlines():
+            entry = json.loads(line)
+            (cycles if "cycle" in entry else entries).append(entry)
+        if (bundle / "verified_output.json").exists():
+            verified = verified or {}
+            for strategy, java_files in json.loads(
+                    (bundle / "verified_output.json").read_text()).items():
+                verified.setdefault(strategy, []).extend(java_files)
+
+    # The merged run is as long as its slowest shard:
+    run_id = telemetry.new_run_id()
+    for entry in entries:
+        entry["run"] = run_id
+    predictions = [c["predicted"] for c in cycles if c.get("predicted")]
+    entries.append(dict(
+        run=run_id, cycle=max(c["cycle"] for c in cycles),
+        jobs=sum(c["jobs"] for c in cycles),
+        examples=sum(c["examples"] for c in cycles),
+        cached=sum(c["cached"] for c in cycles),
+        predicted=max(predictions) if predictions else None))
+    telemetry.append(entries)
+    if verified is not None:
+        _verify_output.write_verified_output(
+            {strategy: sorted(java_files) for strategy, java_files in verified.items()})
+
+    counts = {count for index, count in specs}
+    absent = [f"{index}/{count}" for count in sorted(counts)
+              for index in range(1, count + 1) if (index, count) not in specs]
+    if len(counts) > 1:
+        absent.append(f"(bundles from {len(counts)} different shard counts)")
+    duplicated = sorted(name for name, n in Counter(produced).items() if n > 1)
+    missing = sorted(expected - set(produced))
+    failures = sorted(r["example"] for r in results if r["failed"])
+    print(f"{len(bundles)} shards, {len(results)} examples in "
+          f"{entries[-1]['cycle']:.1f}s, {len(failures)} failed")
+    for label, listed in [("FAILED", failures), ("MISSING", missing),
+                          ("DUPLICATED", duplicated), ("NO BUNDLE FOR SHARD", absent)]:
+        for name in listed:
+            print(f"    {label} {name}")
+    if failures or missing or duplicated or absent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,157 @@
+#! py -3
+"""
+Per-example runtime history: wall time, user/system CPU, peak RSS, exit
+status and output size for every example run, appended as one JSON line
+per record to config.history_dir/run_telemetry.jsonl.
+"""
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import click
+
+import config
+
+history_file = config.history_dir / "run_telemetry.jsonl"
+
+
+def rusage_fields(rusage):
+    """
+    user, sys (seconds) and maxrss (KiB) from os.wait4(); None where unknown.
+    Usage already in this form (as sent by a remote worker) passes through.
+    """
+    if rusage is None:
+        return dict(user=None, sys=None, maxrss=None)
+    if isinstance(rusage, dict):
+        return rusage
+    maxrss = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        maxrss //= 1024  # Reported in bytes, not KiB
+    return dict(user=round(rusage.ru_utime, 3), sys=round(rusage.ru_stime, 3),
+                maxrss=maxrss)
+
+
+def record(run_id, result):
+    "History record for one RunResult"
+    return dict(
+        run=run_id,
+        example=result.example.relative.as_posix(),
+        wall=round(result.wall, 3),
+        status="timeout" if result.timed_out else result.returncode,
+        out=len(result.stdout),
+        err=len(result.stderr),
+        **rusage_fields(result.rusage))
+
+
+def new_run_id():
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+
+
+def cycle_record(run_id, results, total_wall, jobs, predicted=None):
+    "Summary of a whole run (with the scheduler's predicted makespan, if any)"
+    return dict(
+        run=run_id, cycle=round(total_wall, 3), jobs=jobs,
+        examples=len(results),
+        cached=len([r for r in results if r.cached]),
+        predicted=predicted and round(predicted, 3))
+
+
+def run_records(run_id, results, total_wall, jobs, predicted=None):
+    "Records for the examples actually run, then a cycle summary"
+    return ([record(run_id, result) for result in results if not result.cached] +
+            [cycle_record(run_id, results, total_wall, jobs, predicted)])
+
+
+def append(entries):
+    config.history_dir.mkdir(parents=True, exist_ok=True)
+    with history_file.open("a") as history:
+        for entry in entries:
+            history.write(json.dumps(entry) + "\n")
+
+
+def append_run(results, total_wall, jobs, predicted=None):
+    append(run_records(new_run_id(), results, total_wall, jobs, predicted))
+
+
+def load():
+    "(example records by run id, cycle records), in the order they were run"
+    runs = defaultdict(dict)
+    cycles = []
+    if history_file.exists():
+        for line in history_file.read_text().splitlines():
+            entry = json.loads(line)
+            if "cycle" in entry:
+                cycles.append(entry)
+            else:
+                runs[entry["run"]][entry["example"]] = entry
+    return runs, cycles
+
+
+def last_durations():
+    "Most recent recorded wall time for each example"
+    runs, cycles = load()
+    durations = {}
+    for run in runs.values():
+        for example, entry in run.items():
+            durations[example] = entry["wall"]
+    return durations
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.option("--top", "-n", default=20, show_default=True)
+def report(top):
+    """
+    Slowest examples, biggest regressions versus the previous run of
+    each example, and total cycle times
+    """
+    runs, cycles = load()
+    if not runs:
+        print(f"No history in {history_file}")
+        return
+    latest = {}
+    previous = {}
+    for run in runs.values():
+        for example, entry in run.items():
+            if example in latest:
+                previous[example] = latest[example]
+            latest[example] = entry
+
+    print(f"\n{'Slowest examples':=^72}")
+    print(f"{'example':<40}{'wall':>8}{'user':>8}{'sys':>8}{'RSS MB':>8}")
+    for entry in sorted(latest.values(), key=lambda e: -e["wall"])[:top]:
+        rss = entry["maxrss"] / 1024 if entry["maxrss"] else 0
+        print(f"{entry['example']:<40}{entry['wall']:>8.2f}"
+              f"{entry['user'] or 0:>8.2f}{entry['sys'] or 0:>8.2f}{rss:>8.1f}")
+
+    print(f"\n{'Biggest regressions vs previous run':=^72}")
+    print(f"{'example':<40}{'before':>8}{'after':>8}{'ratio':>8}")
+    regressions = [(latest[ex]["wall"] / max(previous[ex]["wall"], 0.001), ex)
+                   for ex in previous]
+    for ratio, example in sorted(regressions, reverse=True)[:top]:
+        if ratio <= 1.0:
+            break
+        print(f"{example:<40}{previous[example]['wall']:>8.2f}"
+              f"{latest[example]['wall']:>8.2f}{ratio:>8.1f}")
+
+    print(f"\n{'Cycles':=^72}")
+    for cycle in cycles[-top:]:
+        predicted = (f" (predicted {cycle['predicted']:.1f}s)"
+                     if cycle.get("predicted") else "")
+        print(f"{cycle['run']}: {cycle['examples']} examples "
+              f"({cycle['cached']} cached), {cycle['jobs']} jobs, "
+              f"{cycle['cycle']:.1f}s{predicted}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,41 @@
+import os
+
+from classpath import Classpaths, class_dir
+
+sources = {
+    "onjava/Nap.java": "package onjava;\npublic class Nap {}\n",
+    "polymorphism/Shape.java": "public class Shape {}\n",
+    "polymorphism/Shapes.java": "import onjava.*;\npublic class Shapes { Shape s; }\n",
+    "interfaces/Shape.java": "public class Shape {}\n",
+    "typeinfo/pets/Pet.java": "package typeinfo.pets;\npublic class Pet {}\n",
+    "generics/Pets.java": "import typeinfo.pets.*;\npublic class Pets { Pet p; }\n",
+}
+
+
+def build(base):
+    for name, text in sources.items():
+        (base / name).parent.mkdir(parents=True, exist_ok=True)
+        (base / name).write_text(text)
+        class_dir(base, name.split("/")[0]).mkdir(parents=True, exist_ok=True)
+
+
+def test_chapter_classes_come_first(tmp_path):
+    build(tmp_path)
+    classpaths = Classpaths(tmp_path)
+    for chapter in ["polymorphism", "interfaces"]:
+        entries = classpaths.runtime(chapter).split(os.pathsep)
+        assert entries[:2] == [str(class_dir(tmp_path, chapter)),
+                               str(class_dir(tmp_path, "onjava"))]
+        assert str(class_dir(tmp_path, "interfaces" if chapter == "polymorphism"
+                             else "polymorphism")) not in entries
+
+
+def test_other_chapters_used(tmp_path):
+    build(tmp_path)
+    assert Classpaths(tmp_path).runtime("generics").split(os.pathsep) == [
+        str(class_dir(tmp_path, chapter)) for chapter in ["generics", "onjava", "typeinfo"]]
+
+
+def test_override(tmp_path):
+    build(tmp_path)
+    assert Classpaths(tmp_path, override="x.jar").runtime("generics") == "x.jar"
@@ -0,0 +1,37 @@
+import markdown_lint
+
+chapter = """\
+Heading
+=======
+
+See [Heading] and [Missing Heading].
+
+An escaped \\[not a link] isn't a cross link.
+
+```java
+// {java Example}
+String[] args = {"[Not] in prose"};
+```
+"""
+
+
+def lint(tmp_path, *names):
+    (tmp_path / "01_Chapter.md").write_text(chapter, encoding="utf-8")
+    return markdown_lint.lint(names, markdown_dir=tmp_path, jobs=1, use_cache=False)
+
+
+def test_links(tmp_path):
+    assert [(f.chapter, f.line, f.message) for f in lint(tmp_path, "links")] == [
+        ("01_Chapter.md", 4, "Missing Heading")]
+
+
+def test_escaped_bracket_is_not_a_link():
+    links = markdown_lint.Chapter("01_Chapter.md", chapter).links
+    assert not [link for n, link in links if "not a link" in link]
+
+
+def test_checks_leave_out_census(tmp_path):
+    assert "java-tags" not in markdown_lint.checks()
+    assert "other-tags" not in markdown_lint.checks()
+    assert not [f for f in lint(tmp_path) if f.rule in markdown_lint.census_rules]
+    assert [f.message for f in lint(tmp_path, "java-tags")] == ["[1]\t// {java Example}"]
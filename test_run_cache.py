@@ -0,0 +1,58 @@
+from directives import RunnableExample
+from run_cache import RunCache
+
+sources = {
+    "onjava/Nap.java": "package onjava;\npublic class Nap {}\n",
+    "typeinfo/pets/Pet.java":
+        "package typeinfo.pets;\nimport onjava.*;\npublic class Pet { Nap nap; }\n",
+    "typeinfo/PetCount.java":
+        "import typeinfo.pets.*;\npublic class PetCount {\n"
+        "  public static void main(String[] args) { new Pet(); }\n}\n",
+    "strings/Hello.java":
+        "public class Hello {\n  public static void main(String[] args) {}\n}\n",
+}
+
+# Class files as the Gradle build leaves them, under each chapter:
+classes = {
+    "onjava/onjava/Nap.class": b"Nap 1",
+    "typeinfo/typeinfo/pets/Pet.class": b"Pet 1",
+    "typeinfo/PetCount.class": b"PetCount 1",
+    "strings/Hello.class": b"Hello 1",
+}
+
+
+def build(base):
+    for name, text in sources.items():
+        (base / name).parent.mkdir(parents=True, exist_ok=True)
+        (base / name).write_text(text)
+    for name, data in classes.items():
+        write_class(base, name, data)
+
+
+def write_class(base, name, data):
+    chapter, rest = name.split("/", 1)
+    path = base / chapter / "build" / "classes" / "java" / "main" / rest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def key(base, name):
+    example = RunnableExample(base / name, base, (base / name).read_text())
+    return RunCache(base).key(example)
+
+
+def test_dependencies_are_transitive(tmp_path):
+    build(tmp_path)
+    example = RunnableExample(tmp_path / "typeinfo/PetCount.java", tmp_path,
+                              sources["typeinfo/PetCount.java"])
+    assert RunCache(tmp_path).dependencies(example) == [
+        ("onjava", ""), ("typeinfo.pets", "")]
+
+
+def test_transitive_change_invalidates_key(tmp_path):
+    build(tmp_path)
+    before = key(tmp_path, "typeinfo/PetCount.java")
+    unrelated = key(tmp_path, "strings/Hello.java")
+    write_class(tmp_path, "onjava/onjava/Nap.class", b"Nap 2")
+    assert key(tmp_path, "typeinfo/PetCount.java") != before
+    assert key(tmp_path, "strings/Hello.java") == unrelated
@@ -0,0 +1,56 @@
+import base64
+import threading
+
+from classpath import Classpaths
+from directives import RunnableExample
+import work_queue
+
+
+def echo_examples(base, count):
+    "Examples that run without Java: each {Exec:}s echo"
+    examples = []
+    for n in range(count):
+        path = base / "echoes" / f"Echo{n}.java"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(f"// {{Exec: echo Echo{n}}}\n/* Output:\nEcho{n}\n*/\n")
+        examples.append(RunnableExample(path, base, path.read_text()))
+    return examples
+
+
+def test_coordinator_and_workers_on_localhost(tmp_path):
+    examples = echo_examples(tmp_path, 8)
+    by_name = {ex.relative.as_posix(): ex for ex in examples}
+    coordinator = work_queue.Coordinator(examples, timeout=30)
+    workers = []
+
+    def start_workers(port):
+        for n in range(3):
+            workers.append(threading.Thread(target=work_queue.work, args=(
+                "127.0.0.1", port, by_name, Classpaths(tmp_path), f"worker {n}")))
+            workers[-1].start()
+
+    serving = threading.Thread(target=work_queue.coordinate, daemon=True,
+                               args=(coordinator, "127.0.0.1", 0, start_workers))
+    serving.start()
+    serving.join(60)
+    for worker in workers:
+        worker.join(10)
+    assert coordinator.done()
+    assert sorted(coordinator.results) == sorted(by_name)
+    assert not [r for r in coordinator.results.values() if r.failed()]
+    assert not coordinator.pending and not coordinator.leases
+    assert (tmp_path / "echoes" / "Echo3.out").read_text() == "/* Output:\nEcho3\n"
+
+
+def test_completion_after_lease_expired(tmp_path):
+    coordinator = work_queue.Coordinator(echo_examples(tmp_path, 2), timeout=30)
+    name = coordinator.lease(None)["job"]
+    coordinator.leases[name] = (None, 0.0)  # Long past its deadline
+    coordinator.expire_leases()
+    assert name in coordinator.pending
+    coordinator.complete(None, dict(
+        example=name, returncode=0, stdout=base64.b64encode(b"late\n").decode(),
+        stderr="", wall=1.0, timed_out=False, rusage=None))
+    assert name in coordinator.results
+    assert name not in coordinator.pending
+    assert coordinator.lease(None)["job"] != name
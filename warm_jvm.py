@@ -0,0 +1,155 @@
+"""
+Run many example main()s in one long-lived JVM (harness/BatchHarness.java),
+so JVM startup is paid once per batch instead of once per example.
+
+Examples that need a JVM of their own (System.exit(), their own threads,
+JVM arguments, expected exceptions ...) are detected from their source and
+left for the forked path. Anything the harness can't run cleanly at run
+time (exception, leftover threads, harness died) is also handed back, so
+the caller can rerun it forked.
+"""
+import queue
+import re
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import capture
+import config
+
+harness_source = Path(__file__).parent / "harness" / "BatchHarness.java"
+harness_dir = config.history_dir / "harness"
+
+fresh_jvm_tags = ["Exec", "JVMArgs", "ThrowsException", "ErrorOutputExpected"]
+
+fresh_jvm_patterns = [re.compile(pattern) for pattern in [
+    r"System\s*\.\s*(?:exit|gc|runFinalization|in|setIn|setOut|setErr)\b",
+    r"Runtime\s*\.\s*getRuntime",
+    r"(?:new|extends)\s+Thread\b",
+    r"Executor|CompletableFuture|ForkJoinPool|\bTimer\b",
+    r"ProcessBuilder|Preferences|ClassLoader|ShutdownHook",
+    r"java\.awt|javax\.swing",
+]]
+
+
+def needs_fresh_jvm(example):
+    if [tag for tag in fresh_jvm_tags if tag in example]:
+        return True
+    if [arg for arg in example.flags.cmd_args() if "\t" in arg or "\n" in arg]:
+        return True  # Can't be sent through the harness protocol
+    return any(pattern.search(example.body) for pattern in fresh_jvm_patterns)
+
+
+def compile_harness():
+    "Compile BatchHarness.java into harness_dir if it's missing or stale"
+    class_file = harness_dir / "BatchHarness.class"
+    if (class_file.exists() and
+            class_file.stat().st_mtime >= harness_source.stat().st_mtime):
+        return
+    harness_dir.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["javac", "-d", str(harness_dir), str(harness_source)],
+                   check=True)
+
+
+class Harness:
+    """
+    One BatchHarness process, started in rundir (examples expect to run
+    in their chapter directory). Restarted as needed after a timeout or
+    a crash.
+    """
+
+    def __init__(self, rundir, classpath, timeout, placement=None):
+        self.rundir = rundir
+        self.placement = placement  # resource_classes.Placement, or None
+        self.classpath = classpath
+        self.timeout = timeout
+        self.proc = None
+        self.responses = None
+        self.count = 0
+
+    def start(self):
+        compile_harness()
+        command = ["java", "-cp", str(harness_dir), "BatchHarness",
+                   self.classpath, str(int(self.timeout * 1000))]
+        self.proc = subprocess.Popen(
+            self.placement.wrap(command) if self.placement else command,
+            cwd=self.rundir, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        self.responses = queue.Queue()
+        threading.Thread(target=self.read_responses,
+                         args=(self.proc.stdout, self.responses),
+                         daemon=True).start()
+
+    @staticmethod
+    def read_responses(stream, responses):
+        """
+        (id, status, out, err) for each response, out and err each
+        (head, tail, omitted lines, dropped bytes); None when the harness exits
+        """
+        while True:
+            header = stream.readline().split()
+            if len(header) != 11 or header[0] != b"@@RESULT":
+                responses.put(None)
+                return
+            sizes = [int(size) for size in header[3:]]
+            out, err = [(stream.read(head), stream.read(tail), omitted, dropped)
+                        for head, tail, omitted, dropped in (sizes[:4], sizes[4:])]
+            responses.put((header[1].decode(), header[2].decode(), out, err))
+
+    @staticmethod
+    def limits(example):
+        "The harness bounds output as capture.for_output_line() would"
+        bounds = capture.for_output_line(example.output_line)
+        head = -1 if bounds.head_lines is None else bounds.head_lines
+        return [str(head), str(bounds.tail.maxlen), str(bounds.max_bytes)]
+
+    def run(self, example):
+        """
+        (returncode, stdout, stderr, wall, timed_out), or None if the
+        example has to be rerun in a JVM of its own
+        """
+        if self.proc is None:
+            self.start()
+        self.count += 1
+        request = "\t".join([str(self.count), *self.limits(example),
+                             example.main_class(), *example.flags.cmd_args()])
+        start = time.perf_counter()
+        try:
+            self.proc.stdin.write(request.encode() + b"\n")
+            self.proc.stdin.flush()
+            response = self.responses.get(timeout=self.timeout + 10)
+        except (OSError, queue.Empty):
+            response = None
+        wall = time.perf_counter() - start
+        if response is None or response[0] != str(self.count):
+            self.close()
+            return None
+        id, status, out, err = response
+        out = capture.restored(*out, example.output_line)
+        err = capture.restored(*err)
+        if status == "TIMEOUT":
+            self.close()  # The harness halts after a timeout
+            return None, out, err, wall, True
+        if status != "OK":
+            if status == "THREADS":
+                self.close()  # The harness halts after leftover threads
+            return None
+        return 0, out, err, wall, False
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
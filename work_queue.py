@@ -0,0 +1,325 @@
+#! py -3
+"""
+Run examples across hosts: a coordinator hands out example jobs over
+TCP, longest first, to workers that pull a job whenever they're idle,
+so fast hosts take more of the work. Workers send back the output and
+resource usage; the coordinator writes the .out/.err files, the cache
+and telemetry exactly as 'run_examples.py run' does.
+
+Each worker needs the same compiled example tree (config.example_dir).
+A job whose worker disconnects, or doesn't answer within its lease
+(the example timeout plus lease_grace), goes back on the queue, at most
+max_attempts times. The protocol has no authentication: bind to a
+trusted network only.
+
+Protocol, one JSON object per line, worker -> coordinator:
+    {"op": "get"}            -> {"job": path, "timeout": s} | {"wait": s} | {"done": true}
+    {"op": "result", ...}    -> {"ok": true}
+"""
+import base64
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import click
+
+import config
+from directories import exists
+from directives import runnable_examples
+from run_cache import RunCache
+from classpath import Classpaths
+from run_examples import (RunResult, finish, from_cache, run_example, select,
+                          summarize)
+from scheduler import Schedule
+import telemetry
+
+default_port = 8677
+lease_grace = 30.0  # Seconds beyond the example timeout before a job is reassigned
+max_attempts = 3
+poll_interval = 0.5  # Seconds a worker waits when every job is leased
+
+
+class Coordinator:
+    "The job queue and its leases"
+
+    def __init__(self, examples, timeout, cache=None):
+        self.examples = {ex.relative.as_posix(): ex for ex in examples}
+        self.pending = deque(self.examples)
+        self.timeout = timeout
+        self.cache = cache
+        self.leases = {}  # Example -> (connection, deadline)
+        self.attempts = Counter()
+        self.results = {}
+        self.lock = threading.Condition()
+
+    def done(self):
+        return len(self.results) == len(self.examples)
+
+    def expire_leases(self):
+        now = time.monotonic()
+        for name, (connection, deadline) in list(self.leases.items()):
+            if deadline < now:
+                print(f"Lease expired: {name}")
+                self.requeue(name)
+
+    def requeue(self, name):
+        del self.leases[name]
+        if self.attempts[name] < max_attempts:
+            self.pending.appendleft(name)  # It was among the longest
+            return
+        self.record(RunResult(
+            self.examples[name], None, b"",
+            f"___[ Lost {self.attempts[name]} workers running this example ]___\n"
+            .encode(), 0.0))
+
+    def record(self, result):
+        self.results[result.example.relative.as_posix()] = result
+        finish(result, self.cache)
+        self.lock.notify_all()
+
+    def lease(self, connection):
+        with self.lock:
+            self.expire_leases()
+            if self.pending:
+                name = self.pending.popleft()
+                self.attempts[name] += 1
+                self.leases[name] = (connection,
+                                     time.monotonic() + self.timeout + lease_grace)
+                return dict(job=name, timeout=self.timeout)
+            if self.done():
+                return dict(done=True)
+            return dict(wait=poll_interval)
+
+    def complete(self, connection, reply):
+        with self.lock:
+            name = reply["example"]
+            if name not in self.examples or name in self.results:
+                return  # A retried job whose first worker finished after all
+            self.leases.pop(name, None)
+            if name in self.pending:  # Its lease expired, but it finished after all
+                self.pending.remove(name)
+            self.record(RunResult(
+                self.examples[name], reply["returncode"],
+                base64.b64decode(reply["stdout"]), base64.b64decode(reply["stderr"]),
+                reply["wall"],
+                timed_out=reply["timed_out"], rusage=reply["rusage"]))
+
+    def release(self, connection):
+        "A worker went away: requeue whatever it was running"
+        with self.lock:
+            for name, (holder, deadline) in list(self.leases.items()):
+                if holder is connection:
+                    print(f"Worker lost while running {name}")
+                    self.requeue(name)
+
+    def wait(self, poll=1.0):
+        with self.lock:
+            while not self.done():
+                self.lock.wait(poll)
+                self.expire_leases()
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        try:
+            for line in self.rfile:
+                request = json.loads(line)
+                if request["op"] == "get":
+                    reply = coordinator.lease(self)
+                else:
+                    coordinator.complete(self, request)
+                    reply = dict(ok=True)
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            coordinator.release(self)
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, coordinator):
+        super().__init__(address, Handler)
+        self.coordinator = coordinator
+
+
+def work(host, port, examples, classpaths, name):
+    "Pull and run jobs until the coordinator has none left"
+    try:
+        pull(host, port, examples, classpaths, name)
+    except (OSError, ValueError) as e:
+        print(f"{name}: {e}")
+
+
+def pull(host, port, examples, classpaths, name):
+    with socket.create_connection((host, port)) as sock:
+        stream = sock.makefile("rwb")
+
+        def call(request):
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError("coordinator went away")
+            return json.loads(line)
+
+        while True:
+            reply = call(dict(op="get"))
+            if "done" in reply:
+                return
+            if "wait" in reply:
+                time.sleep(reply["wait"])
+                continue
+            job = reply["job"]
+            if job in examples:
+                result = run_example(examples[job], classpaths.of(examples[job]),
+                                     reply["timeout"])
+            else:
+                result = RunResult(None, None, b"", f"{name}: no {job} here\n".encode(), 0.0)
+            print(f"{name}: {job} ({result.wall:.2f}s)")
+            call(dict(
+                op="result", example=job, returncode=result.returncode,
+                stdout=base64.b64encode(result.stdout).decode(),
+                stderr=base64.b64encode(result.stderr).decode(),
+                wall=result.wall, timed_out=result.timed_out,
+                rusage=telemetry.rusage_fields(result.rusage)))
+
+
+def coordinate(coordinator, host, port, started=None):
+    """
+    Serve coordinator's jobs until all have results; started, if given,
+    is called with the bound port once workers can connect
+    """
+    with Server((host, port), coordinator) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Coordinator on {host}:{server.server_address[1]}, "
+              f"{len(coordinator.pending)} jobs")
+        if started:
+            started(server.server_address[1])
+        coordinator.wait()
+        server.shutdown()
+
+
+def prepare(patterns, timeout, force, no_cache):
+    "(coordinator, cached results) for the examples matching patterns"
+    base = exists(config.example_dir)
+    examples = select(runnable_examples(base), patterns)
+    cache = None if no_cache else RunCache(base, force)
+    cached = []
+    if cache:
+        cached, examples = from_cache(examples, cache)
+        print(f"{len(cached)} served from cache, {len(examples)} to run")
+    examples = Schedule(examples).longest_first(examples)
+    return Coordinator(examples, timeout, cache), cached
+
+
+def conclude(coordinator, cached, start, workers):
+    results = cached + list(coordinator.results.values())
+    telemetry.append_run(results, time.perf_counter() - start, workers)
+    if summarize(results, time.perf_counter() - start):
+        sys.exit(1)
+
+
+@click.group()
+@click.version_option()
+def cli():
+    pass
+
+
+cli.help = __doc__
+
+
+@cli.command()
+@click.option("--host", default="localhost", show_default=True,
+              help="Interface to listen on (0.0.0.0 for other hosts)")
+@click.option("--port", "-p", default=default_port, show_default=True)
+@click.option("--timeout", "-t", default=60.0, show_default=True,
+              help="Seconds before a worker kills an example")
+@click.option("--force", "-f", is_flag=True,
+              help="Run everything, even examples with cached results")
+@click.option("--no-cache", is_flag=True, help="Neither use nor update the cache")
+@click.argument("patterns", nargs=-1)
+def coordinator(host, port, timeout, force, no_cache, patterns):
+    """
+    Serve the examples (those whose path contains any of PATTERNS, or
+    all) to workers, and collect their results
+    """
+    start = time.perf_counter()
+    queue, cached = prepare(patterns, timeout, force, no_cache)
+    coordinate(queue, host, port)
+    conclude(queue, cached, start, None)
+
+
+@cli.command()
+@click.option("--host", default="localhost", show_default=True,
+              help="Coordinator's host")
+@click.option("--port", "-p", default=default_port, show_default=True)
+@click.option("--jobs", "-j", default=os.cpu_count(), show_default=True,
+              help="Examples to run at once on this host")
+@click.option("--classpath", "-c", default=None,
+              help="Override the classpath found under the example directory")
+def worker(host, port, jobs, classpath):
+    """Run examples for a coordinator until it has no more"""
+    base = exists(config.example_dir)
+    examples = {ex.relative.as_posix(): ex for ex in runnable_examples(base)}
+    classpaths = Classpaths(base, override=classpath)
+    threads = [threading.Thread(target=work, args=(
+        host, port, examples, classpaths, f"{socket.gethostname()}:{os.getpid()}/{n}"))
+        for n in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@cli.command()
+@click.option("--workers", "-w", default=2, show_default=True,
+              help="Worker processes on this host")
+@click.option("--jobs", "-j", default=max(1, (os.cpu_count() or 2) // 2), show_default=True,
+              help="Examples each worker runs at once")
+@click.option("--timeout", "-t", default=60.0, show_default=True)
+@click.option("--force", "-f", is_flag=True)
+@click.option("--no-cache", is_flag=True)
+@click.argument("patterns", nargs=-1)
+def local(workers, jobs, timeout, force, no_cache, patterns):
+    """
+    Coordinator plus worker processes, all on localhost: exercises the
+    protocol and should leave the same results as 'run_examples.py run'
+    """
+    start = time.perf_counter()
+    queue, cached = prepare(patterns, timeout, force, no_cache)
+    processes = []
+
+    def start_workers(port):
+        for n in range(workers):
+            processes.append(subprocess.Popen(
+                [sys.executable, __file__, "worker", "--host", "127.0.0.1",
+                 "--port", str(port), "--jobs", str(jobs)]))
+
+        def watch():  # Don't wait forever if every worker dies
+            for process in processes:
+                process.wait()
+            with queue.lock:
+                if not queue.done():
+                    print("All workers exited with jobs unfinished")
+                    os._exit(1)
+        threading.Thread(target=watch, daemon=True).start()
+
+    coordinate(queue, "127.0.0.1", 0, start_workers)
+    for process in processes:
+        process.wait()
+    conclude(queue, cached, start, workers * jobs)
+
+
+if __name__ == "__main__":
+    cli()
@@ -13,6 +13,7 @@ import re
 from betools import CmdLine, ruler
 import enchant
 import difflib
+import code_fences
 
 rootPath = Path(sys.path[0]).parent / "on-java"
 resource_path = rootPath / "resources"
@@ -104,7 +105,7 @@ def strip_fenced_code_blocks():
         print("Can't find onjava-assembled.md")
         sys.exit()
     with assembled.open(encoding="utf8") as ass:
-        text = code_listings.sub("", ass.read())
+        text = code_fences.strip(ass.read()).text
         text = isolated_code_font.sub("", text)
     with nocode.open("w", encoding="utf8") as nc:
         nc.write(text)
@@ -191,7 +192,7 @@ def spell_check():
 
     for md in markdown_dir.glob("[0-9][0-9]_*.md"):
         with md.open(encoding="utf8") as chapter:
-            text = code_listings.sub("", chapter.read())
+            text = code_fences.strip(chapter.read()).text
             with (test_dir / md.name).open('w', encoding="utf8") as testfile:
                 testfile.write(text)
             for word in text.split():
@@ -250,7 +251,7 @@ def spell_check_2():
 
     for md in markdown_dir.glob("[0-9][0-9]_*.md"):
         with md.open(encoding="utf8") as chapter:
-            text = code_listings.sub("", chapter.read())
+            text = code_fences.strip(chapter.read()).text
             text = extract_backquoted.sub(remove_backquoted, text)
             with (test_dir / md.name).open('w', encoding="utf8") as testfile:
                 testfile.write(text)
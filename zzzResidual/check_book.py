@@ -6,19 +6,18 @@ import logging
 from logging import debug
 logging.basicConfig(filename= __file__.rsplit('.')[0] + '.log', level=logging.DEBUG)
 
-from pathlib import Path
 from pprint import pprint
 from betools import CmdLine
 from code_listing import CodeListing, show
 import config
-
-assert config.build_dir.exists()
-assert config.combined_markdown.exists()
+import markdown_lint
 
 
 @CmdLine('w')
 def check_listing_widths():
     "Make sure listings don't exceed max width of %d" % config.code_width
+    assert config.build_dir.exists()
+    assert config.combined_markdown.exists()
     listings = CodeListing.parse_listings(config.combined_markdown)
     for listing in listings:
         for n, line in enumerate(listing):
@@ -32,13 +31,10 @@ def check_listing_widths():
 
 @CmdLine('t')
 def check_for_trailing_hyphen():
-    "Make sure there are no lines with broken hyphenation"
-    with Path(config.combined_markdown).open(encoding="utf8") as bk:
-        book = bk.readlines()
-    for n, line in enumerate(book):
-        if line.rstrip().endswith("-") and not line.rstrip().endswith("--"):
-            print(n, end=": ")
-            show(line)
+    "Make sure there are no lines with broken hyphenation (source markdown files)"
+    for finding in markdown_lint.lint(["dashes", "trailing-hyphen"]):
+        print("{}:{}".format(finding.chapter, finding.line), end=": ")
+        show(finding.message)
 
 
 @CmdLine('c')
@@ -1,7 +1,9 @@
 from pathlib import Path
 import sys
+import re
 import config
 import os
+from heading_index import HeadingIndex
 
 command = "start /B linkchecker --check-extern -F text /{}-linkcheck.txt {}.xhtml"
 
@@ -12,5 +14,20 @@ def check_links_batch_file():
           print(command.format(xhtml.stem,xhtml.stem))
           print(command.format(xhtml.stem,xhtml.stem), file=batfile)
 
+fragment = re.compile(r'href="[^"#]*#([^"]+)"')
+footnote = re.compile(r"fn(ref)?\d+$")
+
+def check_fragments():
+    "Find links in the xhtml files to identifiers that no heading has"
+    index = HeadingIndex.from_markdown()
+    for xhtml in sorted(config.epub_dir.glob("*.xhtml")):
+        for n, line in enumerate(xhtml.read_text(encoding="utf-8").splitlines(), 1):
+            for ident in fragment.findall(line):
+                if not footnote.match(ident) and "#" + ident not in index:
+                    print("{}:{}: #{}".format(xhtml.name, n, ident))
+
 if __name__ == '__main__':
-    check_links_batch_file()
\ No newline at end of file
+    if "-f" in sys.argv:
+        check_fragments()
+    else:
+        check_links_batch_file()
\ No newline at end of file
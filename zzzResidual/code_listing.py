@@ -2,6 +2,7 @@
 Capture fenced code listings
 """
 import config
+import code_fences
 from pathlib import Path
 
 # Candidate for betools, after adding the "ignore unknown characters" option:
@@ -69,10 +70,11 @@ class CodeListing:
         with Path(book_file_name).open(encoding="utf8") as bk:
             book = bk.readlines()
         listings = []
-        code_listing = CodeListing(book, 0)
-        while code_listing:
+        for start, end in code_fences.fences("".join(book)):
+            # Already found, so skip the search in __init__:
+            code_listing = CodeListing(book, len(book))
+            code_listing.startfence, code_listing.endfence = start, end
             listings.append(code_listing)
-            code_listing = CodeListing.next(code_listing)
         return listings
 
     @staticmethod
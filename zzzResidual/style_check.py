@@ -6,6 +6,11 @@ import re
 import os
 import pprint
 from linewidth import check_listing_widths
+from markdown_lint import LintCache
+import code_fences
+
+# Change when any check changes, to invalidate the cached results:
+checks_version = "1"
 
 def open_on_line(md, n):
     os.system("subl {}:{}".format(md, n + 1))
@@ -51,27 +56,8 @@ def inline_gapped_hyphenation(line):
     if "- " in line or " -" in line:
         return True
 
-class Flag:
-    def __init__(self):
-        self.flag = False
-    def invert(self):
-        self.flag = False if self.flag else True
-    def __bool__(self):
-        return self.flag
-
 def remove_listings(lines):
-    in_listing = Flag()
-    cleaned = []
-    for line in lines:
-        if line.startswith("```"):
-            in_listing.invert()
-            cleaned.append("")
-            continue
-        if in_listing:
-            cleaned.append("")
-        else:
-            cleaned.append(line)
-    return cleaned
+    return code_fences.strip("\n".join(lines), blank_listings=True).lines
 
 
 def bad_hyphenation(lines, md):
@@ -83,7 +69,7 @@ def bad_hyphenation(lines, md):
         bhs = bad_hyph_start.match(line.strip())
         bhe = bad_hyph_end.match(line.strip())
         if bhs or bhe or inline_gapped_hyphenation(line):
-            return open_on_line(md, n)
+            return n
     return None
 
 
@@ -99,7 +85,7 @@ def comment_period(lines, md):
             ):
             continue
         if line.startswith("//") and line.strip().endswith("."):
-            return open_on_line(md, n)
+            return n
     return None
 
 
@@ -121,7 +107,7 @@ def check_listing_widths(lines, md):
         # if in_listing:
         #     print(line, len(line), config.code_width -2, in_output)
         if in_listing and len(line) > (config.code_width -2) and not in_output:
-            return open_on_line(md, n)
+            return n
 
 
 def long_main_style(lines, md):
@@ -135,7 +121,7 @@ def long_main_style(lines, md):
                 continue
             if line == "  void main(String[] args) throws IOException {" and md.name == "17_Exceptions.md":
                 continue
-            return open_on_line(md, n)
+            return n
 
 
 def no_cuddle_parens_and_braces(lines, md):
@@ -143,43 +129,60 @@ def no_cuddle_parens_and_braces(lines, md):
         if '''(abc){2,}''' in line:
             continue
         if "){" in line:
-            return open_on_line(md, n)
+            return n
 
 twr_file = config.example_dir / "try_with_resources.txt"
 
 def try_with_resources_style(lines, md):
     in_try = False
-    with twr_file.open('a') as twr_output:
-        for n, line in enumerate(lines):
-            if "Entry" in line or "industry" in line or "Registry(" in line:
-                continue
-            if "try(" in line or "try (" in line:
-                in_try = True
-                print("[> {}:{}\n".format(md.name, n), file=twr_output)
-            if in_try is True:
-                print(line, file=twr_output)
-            if "{" in line and in_try is True:
-                in_try = False
-                print("\n\n", file=twr_output)
+    twr_output = []
+    for n, line in enumerate(lines):
+        if "Entry" in line or "industry" in line or "Registry(" in line:
+            continue
+        if "try(" in line or "try (" in line:
+            in_try = True
+            twr_output.append("[> {}:{}\n".format(md.name, n))
+        if in_try is True:
+            twr_output.append(line)
+        if "{" in line and in_try is True:
+            in_try = False
+            twr_output.append("\n\n")
+    return "".join(line + "\n" for line in twr_output)
 
 
 
 def post_listing_blank(lines, md):
     for n, line in enumerate(lines):
         if line == "```" and lines[n+1] != "":
-            return open_on_line(md, n)
+            return n
+
+
+style_checks = [
+    bad_hyphenation,
+    comment_period,
+    check_listing_widths,
+    long_main_style,
+    no_cuddle_parens_and_braces,
+    # post_listing_blank,
+]
 
 
-def test(md):
+def test(md, cache):
+    "Run the checks, or replay their cached results if md is unchanged"
     print(md.name)
-    lines = md.read_text(encoding="utf-8").splitlines()
-    bad_hyphenation(lines, md)
-    comment_period(lines, md)
-    check_listing_widths(lines, md)
-    long_main_style(lines, md)
-    no_cuddle_parens_and_braces(lines, md)
-    try_with_resources_style(lines, md)
-    # post_listing_blank(lines, md)
+    text = md.read_text(encoding="utf-8")
+    digest = LintCache.digest(text)
+    result = cache.get(md.name, digest)
+    if result is None:
+        lines = text.splitlines()
+        result = dict(found=[check(lines, md) for check in style_checks],
+                      try_with_resources=try_with_resources_style(lines, md))
+        cache.put(md.name, digest, result)
+    for n in result["found"]:
+        if n is not None:
+            open_on_line(md, n)
+    with twr_file.open('a') as twr_output:
+        twr_output.write(result["try_with_resources"])
 
 
 if __name__ == '__main__':
@@ -188,6 +191,8 @@ if __name__ == '__main__':
     start = ""
     if len(sys.argv) > 1:
         start = sys.argv[1]
+    cache = LintCache("style_check", f"{checks_version}:{config.code_width}")
     for md in config.markdown_dir.glob(start + "*.md"):
-        test(md)
+        test(md, cache)
+    cache.save()
     os.system("subl {}".format(twr_file))